@@ -2,39 +2,53 @@
 # Imports
 #----------------------------------------------------------------------------#
 
-import json
 import dateutil.parser
-import babel
+import babel.dates
 import sys
 import os
-from flask import (Flask, render_template, Response, request, flash, redirect,
-                   url_for, jsonify)
+from flask import (Blueprint, Flask, Response, current_app, render_template,
+                   request, flash, redirect, url_for, jsonify, abort)
 from flask_moment import Moment
-from operator import itemgetter
-from flask_sqlalchemy import SQLAlchemy
 import logging
 from logging import Formatter, FileHandler
-from flask_wtf import Form
-from sqlalchemy import Column, String, Integer, Boolean, DateTime, ForeignKey
-from forms import *
+from forms import VenueForm, ArtistForm, ShowForm, ShowBatchForm
 from flask_migrate import Migrate
-from datetime import datetime, timezone
-from models import db, Artist, Venue, Show
-
-app = Flask(__name__)
-moment = Moment(app)
-NoneType = type(None)
-isinstance(filter, NoneType)
-app.config.from_object('config')
-db = SQLAlchemy(app)
-
-migrate = Migrate(app, db)
+from datetime import datetime
+from itertools import groupby
+from operator import attrgetter
+from sqlalchemy import and_, func, literal, or_, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import contains_eager
+from werkzeug.exceptions import NotFound
+from werkzeug.middleware.proxy_fix import ProxyFix
+from models import (db, Artist, Venue, Show, VenueListItem, ArtistListItem,
+                    ShowTile)
+from templating import configure_jinja, warm_templates
+import profiling
+import assets
+import compression
+import partitions
+from limits import limiter, query_budget
+import idempotency
+import outbox
+from idempotency import idempotent
+import events
+from events import show_events
+from thumbnails import thumbnails
+from catalogue import catalogue
+from edge_cache import edge_cache, entity_keys, show_keys
+import availability
+from pagination import encode_cursor, decode_cursor
+
+moment = Moment()
+migrate = Migrate()
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
 
+@profiling.traced('format_datetime')
 def format_datetime(value, format='medium'):
     date = dateutil.parser.parse(value)
     if format == 'full':
@@ -44,14 +58,75 @@ def format_datetime(value, format='medium'):
     return babel.dates.format_datetime(date, format, locale='en')
 
 
-app.jinja_env.filters['datetime'] = format_datetime
+#----------------------------------------------------------------------------#
+# App Factory.
+#----------------------------------------------------------------------------#
+
+
+def create_app(config_object='config'):
+    app = Flask(__name__)
+    app.config.from_object(config_object)
+    if app.config.get('PROXY_FIX_X_FOR'):
+        # remote_addr becomes the address the outermost trusted proxy saw.
+        app.wsgi_app = ProxyFix(app.wsgi_app,
+                                x_for=app.config['PROXY_FIX_X_FOR'])
+    configure_jinja(app)
+
+    # after_request hooks run in reverse order of registration; compression
+    # goes first so it sees the final response.
+    compression.init_app(app)
+    db.init_app(app)
+    migrate.init_app(app, db)
+    partitions.init_app(app, db)
+    limiter.init_app(app)
+    idempotency.init_app(app)
+    outbox.init_app(app)
+    show_events.init_app(app, db)
+    catalogue.init_app(app, db)
+    edge_cache.init_app(app)
+    profiling.init_app(app)
+    thumbnails.init_app(app)
+    moment.init_app(app)
+
+    app.jinja_env.filters['datetime'] = format_datetime
+    app.register_blueprint(bp)
+
+    @app.cli.command('refresh-upcoming-shows')
+    def refresh_upcoming_shows_command():
+        """Recount every artist's upcoming shows (run it from cron: shows
+        that have started stay counted until then)."""
+        changed = Artist.refresh_upcoming_shows()
+        db.session.commit()
+        print('{} artists updated'.format(changed))
+
+    assets.init_app(app)
+    if app.config.get('TEMPLATE_WARMUP'):
+        warm_templates(app)
+
+    if not app.debug:
+        file_handler = FileHandler('error.log')
+        file_handler.setFormatter(
+            Formatter(
+                '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
+            ))
+        app.logger.setLevel(logging.INFO)
+        file_handler.setLevel(logging.INFO)
+        app.logger.addHandler(file_handler)
+        app.logger.info('errors')
+
+    return app
+
 
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
+# Registered on each app by create_app(); endpoints are 'main.<view>'.
+bp = Blueprint('main', __name__)
+
 
-@app.route('/')
+@bp.route('/')
+@edge_cache.cache('page')
 def index():
     return render_template('pages/home.html')
 
@@ -60,30 +135,39 @@ def index():
 #  ----------------------------------------------------------------
 
 
-@app.route('/venues')
+@bp.route('/venues')
+@edge_cache.cache('list')
 def venues():
     #       num_shows should be aggregated based on number of upcoming shows per venue.
     result = []
-    venues = db.session.query(Venue.city,
-                              Venue.state).distinct(Venue.city, Venue.state)
-    for venue in venues:
-        venues_in_city = db.session.query(Venue.id, Venue.name).filter(
-            Venue.city == venue[0]).filter(Venue.state == venue[1])
+    venues = db.session.query(
+        Venue.id, Venue.name, Venue.city,
+        Venue.state).filter(Venue.deleted_at.is_(None)).order_by(
+            Venue.state, Venue.city, Venue.id)
+    rows = [VenueListItem._make(row) for row in venues]
+    for (city, state), venues_in_city in groupby(rows,
+                                                 key=attrgetter(
+                                                     'city', 'state')):
         result.append({
-            "city": venue[0],
-            "state": venue[1],
-            "venues": venues_in_city
+            "city": city,
+            "state": state,
+            "venues": list(venues_in_city)
         })
+    edge_cache.tag('venues')
     return render_template('pages/venues.html', areas=result)
 
 
-@app.route('/venues/search', methods=['POST'])
+@bp.route('/venues/search', methods=['POST'])
+@limiter.limit('search')
+@query_budget(db, 'SEARCH_QUERY_BUDGET_MS')
 def search_venues():
     # seach for Hop should return "The Musical Hop".
     # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-    search_term = request.form.get('search_term')
-    search_results = Venue.query.filter(
-        Venue.name.ilike('%{}%'.format(search_term))).all()
+    search_term = request.form.get('search_term', '')
+    search_results = catalogue.search('venue', search_term)
+    if search_results is None:
+        search_results = Venue.list_items(
+            Venue.name.ilike('%{}%'.format(search_term)))
 
     response = {}
     response['count'] = len(search_results)
@@ -93,21 +177,25 @@ def search_venues():
                            search_term=request.form.get('search_term', ''))
 
 
-@app.route('/venues/<int:venue_id>')
+@bp.route('/venues/<int:venue_id>')
+@edge_cache.cache('detail')
 def show_venue(venue_id):
-    venue = Venue.query.get(venue_id)
+    venue = Venue.active().filter(Venue.id == venue_id).first()
 
+    edge_cache.tag('venue-%d' % venue_id)
     if not venue:
         return render_template('errors/404.html')
 
-    upcoming_shows_query = db.session.query(Show).join(Artist).filter(
-        Show.venue_id == venue_id).filter(
-            Show.start_time > datetime.now()).all()
+    upcoming_shows_query = db.session.query(Show).join(Artist).options(
+        contains_eager(Show.artist)).filter(Show.venue_id == venue_id).filter(
+            Show.deleted_at.is_(None)).filter(
+                Show.start_time > datetime.now()).all()
     upcoming_shows = []
 
-    past_shows_query = db.session.query(Show).join(Artist).filter(
-        Show.venue_id == venue_id).filter(
-            Show.start_time < datetime.now()).all()
+    past_shows_query = db.session.query(Show).join(Artist).options(
+        contains_eager(Show.artist)).filter(Show.venue_id == venue_id).filter(
+            Show.deleted_at.is_(None)).filter(
+                Show.start_time < datetime.now()).all()
     past_shows = []
 
     for show in past_shows_query:
@@ -134,6 +222,10 @@ def show_venue(venue_id):
             show.start_time.strftime("%Y-%m-%d %H:%M:%S")
         })
 
+    listed = past_shows_query + upcoming_shows_query
+    edge_cache.tag(*entity_keys('artist', {show.artist_id for show in listed}))
+    edge_cache.tag(*entity_keys('show', [show.id for show in listed]))
+
     data = {
         "id": venue.id,
         "name": venue.name,
@@ -155,17 +247,36 @@ def show_venue(venue_id):
     return render_template('pages/show_venue.html', venue=data)
 
 
+@bp.route('/venues/<int:venue_id>/availability')
+@edge_cache.cache('availability')
+def venue_availability(venue_id):
+    if Venue.active().filter(Venue.id == venue_id).count() == 0:
+        return jsonify({'success': False}), 404
+    try:
+        start, end = availability.parse_window(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    data = availability.calendar(db, Show.venue_id, venue_id, start, end)
+    data['venue_id'] = venue_id
+    # Busy slots come from shows by any artist: deleting an artist hides
+    # its shows and purges 'shows', not this venue's key.
+    edge_cache.tag('shows', 'venue-%d' % venue_id)
+    return jsonify(data)
+
+
 #  Create Venue
 #  ----------------------------------------------------------------
 
 
-@app.route('/venues/create', methods=['GET'])
+@bp.route('/venues/create', methods=['GET'])
 def create_venue_form():
     form = VenueForm()
     return render_template('forms/new_venue.html', form=form)
 
 
-@app.route('/venues/create', methods=['POST'])
+@bp.route('/venues/create', methods=['POST'])
+@limiter.limit('write')
+@idempotent
 def create_venue_submission():
     error = False
     try:
@@ -185,7 +296,9 @@ def create_venue_submission():
                   seeking_talent=seeking_talent, seeking_description=seeking_description, image_link=image_link, \
                   website=website, facebook_link=facebook_link)
         db.session.add(new_venue)
+        outbox.record_row(new_venue, 'create')
         db.session.commit()
+        venue_id = new_venue.id
     except:
         error = True
         db.session.rollback()
@@ -193,43 +306,173 @@ def create_venue_submission():
     finally:
         db.session.close()
         if error:
+            idempotency.release()
             flash('An error occured. Venue ' + request.form['name'] +
                   ' Could not be listed!')
         else:
             flash('Venue ' + request.form['name'] +
                   ' was successfully listed!')
+            thumbnails.enqueue(image_link)
+            catalogue.refresh_soon()
+            edge_cache.purge('venues', 'venue-%d' % venue_id)
     return render_template('pages/home.html')
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@bp.route('/venues/<int:venue_id>', methods=['DELETE'])
+@limiter.limit('write')
 def delete_venue(venue_id):
-    # TODO: Complete this endpoint for taking a venue_id, and using
-    # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
+    # Soft delete: the venue and its shows are hidden but kept. Show rows
+    # leave with their month's partition when it is archived; Venue rows
+    # are never dropped.
+    error = False
     try:
-        venue = Venue.query.get(venue_id)
+        venue = Venue.active().filter(Venue.id == venue_id).first()
+        if venue is None:
+            return jsonify({'success': False}), 404
+        outbox.record_soft_delete(venue, venue.soft_delete())
+        Artist.refresh_upcoming_shows(
+            db.session.query(Show.artist_id).filter(Show.venue_id == venue_id))
         db.session.commit()
     except:
+        error = True
         db.session.rollback()
+        print(sys.exc_info())
     finally:
         db.session.close()
-    # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
-    # clicking that button delete it from the db then redirect the user to the homepage
-    return None
+    if error:
+        return jsonify({'success': False}), 500
+    catalogue.refresh_soon()
+    edge_cache.purge('venues', 'shows', 'artists', 'venue-%d' % venue_id)
+    return jsonify({'success': True})
 
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route('/artists')
+ARTIST_FILTERS = ('city', 'state', 'genre', 'seeking_venue')
+ARTIST_SORTS = ('name', 'upcoming')
+
+
+def artist_page(args, page_size):
+    """One keyset page of the /artists listing: (items, next cursor or
+    None). Raises ValueError for bad arguments."""
+    sort = args.get('sort') or 'name'
+    if sort not in ARTIST_SORTS:
+        raise ValueError('unknown sort order')
+    criteria = [Artist.deleted_at.is_(None)]
+    if args.get('city'):
+        criteria.append(Artist.city == args['city'])
+    if args.get('state'):
+        criteria.append(Artist.state == args['state'])
+    if args.get('genre'):
+        # genres is stored comma separated.
+        criteria.append((literal(',') + Artist.genres + literal(',')).contains(
+            ',{},'.format(args['genre']), autoescape=True))
+    if args.get('seeking_venue') in ('yes', 'no'):
+        criteria.append(Artist.seeking_venue == (args['seeking_venue'] ==
+                                                 'yes'))
+    key = decode_cursor(args['after'], sort) if args.get('after') else None
+    if key is not None and len(key) != 2:
+        raise ValueError('invalid cursor')
+    columns = (Artist.id, Artist.name, Artist.city, Artist.state)
+
+    if sort == 'name':
+        if key is not None and not (isinstance(key[0], (str, type(None)))
+                                    and isinstance(key[1], int)):
+            raise ValueError('invalid cursor')
+        # Artists without a name come after all the others, by id, on every
+        # backend: page through the named ones, then the rest.
+        named = db.session.query(*columns).filter(*criteria,
+                                                  Artist.name.isnot(None))
+        unnamed = db.session.query(*columns).filter(*criteria,
+                                                    Artist.name.is_(None))
+        if key is not None and key[0] is None:
+            named = None
+            unnamed = unnamed.filter(Artist.id > key[1])
+        elif key is not None:
+            named = named.filter(
+                tuple_(Artist.name, Artist.id) > tuple_(key[0], key[1]))
+        rows = named.order_by(Artist.name, Artist.id).limit(
+            page_size + 1).all() if named is not None else []
+        if len(rows) <= page_size:
+            rows += unnamed.order_by(Artist.id).limit(page_size + 1 -
+                                                      len(rows)).all()
+        rows = [row + (None, ) for row in rows]
+    else:
+        # Reads the stored count through ix_Artist_upcoming_shows_id, so a
+        # page costs the same however many artists match. Ties go newest
+        # artist first so the whole key sorts one way.
+        query = db.session.query(*columns,
+                                 Artist.upcoming_shows).filter(*criteria)
+        if key is not None:
+            if not all(isinstance(value, int) for value in key):
+                raise ValueError('invalid cursor')
+            query = query.filter(
+                tuple_(Artist.upcoming_shows, Artist.id) < tuple_(
+                    key[0], key[1]))
+        rows = query.order_by(Artist.upcoming_shows.desc(),
+                              Artist.id.desc()).limit(page_size + 1).all()
+
+    items = [ArtistListItem._make(row) for row in rows[:page_size]]
+    next_cursor = None
+    if len(rows) > page_size:
+        last = items[-1]
+        next_cursor = encode_cursor(
+            sort, (last.name, last.id) if sort == 'name' else
+            (last.upcoming_shows, last.id))
+    return items, next_cursor
+
+
+@bp.route('/artists')
+@edge_cache.cache('list')
 def artists():
-    # TODO: replace with real data returned from querying the database
-    return render_template('pages/artists.html', artists=Artist.query.all())
+    try:
+        items, next_cursor = artist_page(
+            request.args, current_app.config['ARTISTS_PAGE_SIZE'])
+    except ValueError:
+        abort(400)
+    filters = {
+        name: request.args[name]
+        for name in ARTIST_FILTERS + ('sort', ) if request.args.get(name)
+    }
+    edge_cache.tag('artists')
+    return render_template('pages/artists.html',
+                           artists=items,
+                           filters=filters,
+                           next_cursor=next_cursor)
 
 
-@app.route('/artists/search', methods=['POST'])
+@bp.route('/artists/<int:artist_id>', methods=['DELETE'])
+@limiter.limit('write')
+def delete_artist(artist_id):
+    error = False
+    try:
+        artist = Artist.active().filter(Artist.id == artist_id).first()
+        if artist is None:
+            return jsonify({'success': False}), 404
+        outbox.record_soft_delete(artist, artist.soft_delete())
+        db.session.commit()
+    except:
+        error = True
+        db.session.rollback()
+        print(sys.exc_info())
+    finally:
+        db.session.close()
+    if error:
+        return jsonify({'success': False}), 500
+    catalogue.refresh_soon()
+    edge_cache.purge('artists', 'shows', 'artist-%d' % artist_id)
+    return jsonify({'success': True})
+
+
+@bp.route('/artists/search', methods=['POST'])
+@limiter.limit('search')
+@query_budget(db, 'SEARCH_QUERY_BUDGET_MS')
 def search_artists():
-    search_term = request.form.get('search_term')
-    search_results = Artist.query.filter(
-        Artist.name.ilike('%{}%'.format(search_term))).all()
+    search_term = request.form.get('search_term', '')
+    search_results = catalogue.search('artist', search_term)
+    if search_results is None:
+        search_results = Artist.list_items(
+            Artist.name.ilike('%{}%'.format(search_term)))
 
     response = {}
     response['count'] = len(search_results)
@@ -239,21 +482,25 @@ def search_artists():
                            search_term=request.form.get('search_term', ''))
 
 
-@app.route('/artists/<int:artist_id>')
+@bp.route('/artists/<int:artist_id>')
+@edge_cache.cache('detail')
 def show_artist(artist_id):
-    artist = Artist.query.get(artist_id)
+    artist = Artist.active().filter(Artist.id == artist_id).first()
 
+    edge_cache.tag('artist-%d' % artist_id)
     if not artist:
         return render_template('errors/404.html')
 
-    upcoming_shows_query = db.session.query(Show).join(Venue).filter(
-        Show.artist_id == artist_id).filter(
-            Show.start_time > datetime.now()).all()
+    upcoming_shows_query = db.session.query(Show).join(Venue).options(
+        contains_eager(Show.venue)).filter(Show.artist_id == artist_id).filter(
+            Show.deleted_at.is_(None)).filter(
+                Show.start_time > datetime.now()).all()
     upcoming_shows = []
 
-    past_shows_query = db.session.query(Show).join(Venue).filter(
-        Show.artist_id == artist_id).filter(
-            Show.start_time < datetime.now()).all()
+    past_shows_query = db.session.query(Show).join(Venue).options(
+        contains_eager(Show.venue)).filter(Show.artist_id == artist_id).filter(
+            Show.deleted_at.is_(None)).filter(
+                Show.start_time < datetime.now()).all()
     past_shows = []
 
     for show in past_shows_query:
@@ -280,6 +527,10 @@ def show_artist(artist_id):
             show.start_time.strftime('%Y-%m-%d %H:%M:%S')
         })
 
+    listed = past_shows_query + upcoming_shows_query
+    edge_cache.tag(*entity_keys('venue', {show.venue_id for show in listed}))
+    edge_cache.tag(*entity_keys('show', [show.id for show in listed]))
+
     data = {
         "id": artist.id,
         "name": artist.name,
@@ -299,36 +550,57 @@ def show_artist(artist_id):
     return render_template('pages/show_artist.html', artist=data)
 
 
+@bp.route('/artists/<int:artist_id>/availability')
+@edge_cache.cache('availability')
+def artist_availability(artist_id):
+    if Artist.active().filter(Artist.id == artist_id).count() == 0:
+        return jsonify({'success': False}), 404
+    try:
+        start, end = availability.parse_window(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    data = availability.calendar(db, Show.artist_id, artist_id, start, end)
+    data['artist_id'] = artist_id
+    # Busy slots come from shows at any venue: deleting a venue hides its
+    # shows and purges 'shows', not this artist's key.
+    edge_cache.tag('shows', 'artist-%d' % artist_id)
+    return jsonify(data)
+
+
 #  Update
 #  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@bp.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
-    form = ArtistForm()
-    artist = Artist.query.get(artist_id)
+    artist = Artist.active().filter(Artist.id == artist_id).first_or_404()
+    form = ArtistForm(obj=artist)
+    form.genres.data = artist.genres.split(',') if artist.genres else []
+    form.seeking_venue.data = 'Yes' if artist.seeking_venue else 'No'
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@bp.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@limiter.limit('write')
+@idempotent
 def edit_artist_submission(artist_id):
     error = False
     try:
-        artist = Artist.query.get(artist_id)
+        artist = Artist.active().filter(Artist.id == artist_id).first_or_404()
         form = ArtistForm()
-        name = form.name.data
-        city = form.city.data
-        state = form.state.data
-        phone = form.phone.data
-        genres = form.genres.data
-        seeking_venue = True if form.seeking_venue.data == 'Yes' else False
-        seeking_description = form.seeking_description.data
-        image_link = form.image_link.data
-        website = form.website.data
-        facebook_link = form.facebook_link.data
-        new_artist = Artist(name=name, city=city, state=state, phone=phone, \
-                  seeking_venue=seeking_venue, seeking_description=seeking_description, image_link=image_link, \
-                  website=website, facebook_link=facebook_link)
-        db.session.add(new_artist)
+        artist.name = form.name.data
+        artist.city = form.city.data
+        artist.state = form.state.data
+        artist.phone = form.phone.data
+        artist.genres = ','.join(form.genres.data)
+        artist.seeking_venue = True if form.seeking_venue.data == 'Yes' else False
+        artist.seeking_description = form.seeking_description.data
+        artist.image_link = form.image_link.data
+        artist.website = form.website.data
+        artist.facebook_link = form.facebook_link.data
+        image_link = artist.image_link
+        outbox.record_row(artist, 'update')
         db.session.commit()
+    except NotFound:
+        raise
     except:
         error = True
         db.session.rollback()
@@ -336,35 +608,47 @@ def edit_artist_submission(artist_id):
     finally:
         db.session.close()
         if error:
+            idempotency.release()
             flash('An error occured')
-
-    return redirect(url_for('show_artist', artist_id=artist_id))
+    # After the try: a 404 propagates out of it and must not run these.
+    if not error:
+        thumbnails.enqueue(image_link)
+        catalogue.refresh_soon()
+        edge_cache.purge('artists', 'shows', 'artist-%d' % artist_id)
+    return redirect(url_for('.show_artist', artist_id=artist_id))
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@bp.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
-    form = VenueForm()
-    venue = Venue.query.get(venue_id).to_dict()
-    # TODO: populate form with values from venue with ID <venue_id>
+    venue = Venue.active().filter(Venue.id == venue_id).first_or_404()
+    form = VenueForm(obj=venue)
+    form.seeking_talent.data = 'Yes' if venue.seeking_talent else 'No'
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@bp.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@limiter.limit('write')
+@idempotent
 def edit_venue_submission(venue_id):
     error = False
     try:
+        venue = Venue.active().filter(Venue.id == venue_id).first_or_404()
         form = VenueForm()
-        name = form.name.data
-        city = form.city.data
-        state = form.state.data
-        address = form.address.data
-        phone = form.phone.data
-        genres = form.genres.data
-        facebook_link = form.facebook_link.data
-        new_venue = Venue(name=name, city=city, state=state, address=address, phone=phone, \
-        facebook_link=facebook_link)
-        db.session.add(new_venue)
+        venue.name = form.name.data
+        venue.city = form.city.data
+        venue.state = form.state.data
+        venue.address = form.address.data
+        venue.phone = form.phone.data
+        venue.seeking_talent = True if form.seeking_talent.data == 'Yes' else False
+        venue.seeking_description = form.seeking_description.data
+        venue.image_link = form.image_link.data
+        venue.website = form.website.data
+        venue.facebook_link = form.facebook_link.data
+        image_link = venue.image_link
+        outbox.record_row(venue, 'update')
         db.session.commit()
+    except NotFound:
+        raise
     except:
         error = True
         db.session.rollback()
@@ -372,25 +656,32 @@ def edit_venue_submission(venue_id):
     finally:
         db.session.close()
         if error:
+            idempotency.release()
             flash('An error occured. Venue ' + request.form['name'] +
                   ' Could not be updated!')
         else:
             flash('Venue ' + request.form['name'] +
                   ' was successfully updated!')
-    return redirect(url_for('show_venue', venue_id=venue_id))
+    if not error:
+        thumbnails.enqueue(image_link)
+        catalogue.refresh_soon()
+        edge_cache.purge('venues', 'shows', 'venue-%d' % venue_id)
+    return redirect(url_for('.show_venue', venue_id=venue_id))
 
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/create', methods=['GET'])
+@bp.route('/artists/create', methods=['GET'])
 def create_artist_form():
     form = ArtistForm()
     return render_template('forms/new_artist.html', form=form)
 
 
-@app.route('/artists/create', methods=['POST'])
+@bp.route('/artists/create', methods=['POST'])
+@limiter.limit('write')
+@idempotent
 def create_artist_submission():
     error = False
     try:
@@ -406,10 +697,13 @@ def create_artist_submission():
         website = form.website.data
         facebook_link = form.facebook_link.data
         new_artist = Artist(name=name, city=city, state=state, phone=phone, \
-                  seeking_venue=seeking_venue, seeking_description=seeking_description, image_link=image_link, \
+                  genres=','.join(genres), seeking_venue=seeking_venue, \
+                  seeking_description=seeking_description, image_link=image_link, \
                   website=website, facebook_link=facebook_link)
         db.session.add(new_artist)
+        outbox.record_row(new_artist, 'create')
         db.session.commit()
+        artist_id = new_artist.id
     except:
         error = True
         db.session.rollback()
@@ -417,11 +711,15 @@ def create_artist_submission():
     finally:
         db.session.close()
         if error:
+            idempotency.release()
             flash('An error occured. Artist ' + request.form['name'] +
                   ' Could not be listed!')
         else:
             flash('Artist ' + request.form['name'] +
                   ' was successfully listed!')
+            thumbnails.enqueue(image_link)
+            catalogue.refresh_soon()
+            edge_cache.purge('artists', 'artist-%d' % artist_id)
     return render_template('pages/home.html')
 
 
@@ -429,77 +727,293 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 
-@app.route('/shows')
+@bp.route('/shows')
+@edge_cache.cache('list')
 def shows():
     # displays list of shows at /shows
     # TODO: replace with real venues data.
     #       num_shows should be aggregated based on number of upcoming shows per venue.
-    data = []
-    shows = Show.query.all()
-
-    for show in shows:
-        data.append({
-            "venue_id": show.venue.id,
-            "venue_name": show.venue.name,
-            "artist_id": show.artist.id,
-            "artist_name": show.artist.name,
-            "artist_image_link": show.artist.image_link,
-            "start_time": format_datetime(str(show.start_time))
-        })
+    # Names and images come from the shared catalogue snapshot rather than
+    # a join on every request.
+    shows = db.session.query(Show.venue_id, Show.artist_id,
+                             Show.start_time).filter(
+                                 Show.deleted_at.is_(None)).order_by(
+                                     Show.id).all()
+    venues = catalogue.lookup('venue', {show.venue_id for show in shows})
+    artists = catalogue.lookup('artist', {show.artist_id for show in shows})
+    data = [
+        ShowTile(venue_id, venues[venue_id].name, artist_id,
+                 artists[artist_id].name, artists[artist_id].image_link,
+                 format_datetime(str(start_time)))
+        for venue_id, artist_id, start_time in shows
+        if venue_id in venues and artist_id in artists
+    ]
+    # Too many ids to list; every show write purges 'shows'.
+    edge_cache.tag('shows')
     return render_template('pages/shows.html', shows=data)
 
 
-@app.route('/shows/create')
+@bp.route('/shows/stream')
+def shows_stream():
+    # Server-Sent Events: one "show" event with a rendered tile per newly
+    # listed show.
+    subscription = show_events.subscribe()
+    return Response(events.stream(show_events, subscription,
+                                  current_app.config['EVENTS_KEEPALIVE']),
+                    mimetype='text/event-stream',
+                    headers={
+                        'Cache-Control': 'no-cache',
+                        'X-Accel-Buffering': 'no'
+                    })
+
+
+@bp.route('/shows/create')
 def create_shows():
     # renders form. do not touch.
     form = ShowForm()
     return render_template('forms/new_show.html', form=form)
 
 
-@app.route('/shows/create', methods=['POST'])
+@bp.route('/shows/create', methods=['POST'])
+@limiter.limit('write')
+@idempotent
 def create_show_submission():
     # called to create new shows in the db, upon submitting new show listing form
     error = False
+    duplicate = False
+    unknown = None
     try:
-        show = Show()
-        show.artist_id = request.form['artist_id']
-        show.venue_id = request.form['venue_id']
-        show.start_time = request.form['start_time']
-        db.session.add(show)
-        db.session.commit()
+        show = Show(artist_id=int(request.form['artist_id']),
+                    venue_id=int(request.form['venue_id']),
+                    start_time=dateutil.parser.parse(
+                        request.form['start_time']))
+        if Artist.active().filter(Artist.id == show.artist_id).count() == 0:
+            unknown = 'artist'
+        elif Venue.active().filter(Venue.id == show.venue_id).count() == 0:
+            unknown = 'venue'
+        else:
+            partitions.ensure_for(db.engine, [show.start_time])
+            db.session.add(show)
+            outbox.record_row(show, 'create')
+            Artist.refresh_upcoming_shows([show.artist_id])
+            db.session.commit()
+            created = [{
+                'artist_id': show.artist_id,
+                'venue_id': show.venue_id,
+                'start_time': show.start_time
+            }]
+    except IntegrityError:
+        db.session.rollback()
+        # Only a uq_Show_artist_id_venue_id_start_time violation means it is
+        # already listed. Look for the row rather than matching the name:
+        # on PostgreSQL the error names the partition's copy of the index.
+        duplicate = db.session.query(
+            Show.query.filter(Show.artist_id == show.artist_id,
+                              Show.venue_id == show.venue_id,
+                              Show.start_time == show.start_time).exists()
+        ).scalar()
+        if not duplicate:
+            error = True
+            print(sys.exc_info())
     except:
         error = True
         db.session.rollback()
         print(sys.exc_info())
     finally:
         db.session.close()
-        if error:
+        if duplicate:
+            flash('This show is already listed.')
+        elif unknown:
+            flash('Requested show could not be listed: unknown {}.'.format(
+                unknown))
+        elif error:
+            idempotency.release()
             flash('An error occurred. Requested show could not be listed.')
         else:
             flash('Requested show was successfully listed')
+            show_events.shows_created(created)
+            edge_cache.purge(*show_keys(created))
         return render_template('pages/home.html')
 
 
-@app.errorhandler(404)
+def parse_show_lines(text):
+    rows = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        parts = [part.strip() for part in line.split(',', 2)]
+        parts += [''] * (3 - len(parts))
+        rows.append({
+            'artist_id': parts[0],
+            'venue_id': parts[1],
+            'start_time': parts[2]
+        })
+    return rows
+
+
+def schedule_shows(rows):
+    # Validates a whole tour and inserts it all-or-nothing: if any row is
+    # rejected, nothing is written. Returns one result dict per input row.
+    results = []
+    for row in rows:
+        result = {
+            'artist_id': row.get('artist_id'),
+            'venue_id': row.get('venue_id'),
+            'start_time': row.get('start_time'),
+            'status': 'ok',
+            'error': None
+        }
+        try:
+            result['artist_id'] = int(row.get('artist_id'))
+            result['venue_id'] = int(row.get('venue_id'))
+        except (TypeError, ValueError):
+            result['status'], result['error'] = 'error', 'invalid id'
+        try:
+            result['start_time'] = dateutil.parser.parse(
+                str(row.get('start_time')))
+        except (TypeError, ValueError, OverflowError):
+            result['status'], result['error'] = 'error', 'invalid start time'
+        results.append(result)
+
+    valid = [r for r in results if r['status'] == 'ok']
+    artist_ids = {r['artist_id'] for r in valid}
+    venue_ids = {r['venue_id'] for r in valid}
+    known_artists = {
+        id
+        for id, in db.session.query(Artist.id).filter(
+            Artist.id.in_(artist_ids), Artist.deleted_at.is_(None))
+    } if artist_ids else set()
+    known_venues = {
+        id
+        for id, in db.session.query(Venue.id).filter(
+            Venue.id.in_(venue_ids), Venue.deleted_at.is_(None))
+    } if venue_ids else set()
+    existing = {
+        tuple(show)
+        for show in db.session.query(Show.artist_id, Show.venue_id,
+                                     Show.start_time).filter(
+                                         Show.artist_id.in_(artist_ids),
+                                         Show.deleted_at.is_(None),
+                                         Show.start_time.in_(
+                                             {r['start_time']
+                                              for r in valid}))
+    } if valid else set()
+
+    seen = set()
+    for result in valid:
+        key = (result['artist_id'], result['venue_id'], result['start_time'])
+        if result['artist_id'] not in known_artists:
+            result['status'], result['error'] = 'error', 'unknown artist'
+        elif result['venue_id'] not in known_venues:
+            result['status'], result['error'] = 'error', 'unknown venue'
+        elif key in existing:
+            result['status'], result['error'] = 'error', 'already listed'
+        elif key in seen:
+            result['status'], result['error'] = 'error', 'duplicate in batch'
+        seen.add(key)
+
+    if not results or any(r['status'] != 'ok' for r in results):
+        return False, results
+
+    try:
+        # Only for a batch that will be written. End the read transaction
+        # first: it holds a lock on "Show" that creating a partition waits
+        # for.
+        db.session.rollback()
+        partitions.ensure_for(db.engine, [r['start_time'] for r in results])
+        db.session.execute(Show.__table__.insert().values([{
+            'artist_id': r['artist_id'],
+            'venue_id': r['venue_id'],
+            'start_time': r['start_time']
+        } for r in results]))
+        # Read the new rows back for their ids, in the same transaction.
+        for show in Show.query.filter(
+                tuple_(Show.artist_id, Show.venue_id, Show.start_time).in_([
+                    (r['artist_id'], r['venue_id'], r['start_time'])
+                    for r in results
+                ])).order_by(Show.id):
+            outbox.record_row(show, 'create')
+        Artist.refresh_upcoming_shows(artist_ids)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        print(sys.exc_info())
+        for result in results:
+            result['status'], result['error'] = 'error', 'not saved'
+        return False, results
+    finally:
+        db.session.close()
+
+    for result in results:
+        result['status'] = 'created'
+    show_events.shows_created(results)
+    edge_cache.purge(*show_keys(results))
+    return True, results
+
+
+@bp.route('/shows/batch', methods=['GET'])
+def create_show_batch_form():
+    form = ShowBatchForm()
+    return render_template('forms/new_show_batch.html', form=form)
+
+
+@bp.route('/shows/batch', methods=['POST'])
+@limiter.limit('write')
+@idempotent
+def create_show_batch_submission():
+    max_rows = current_app.config['SHOW_BATCH_MAX_ROWS']
+    if request.is_json:
+        payload = request.get_json(silent=True)
+        rows = payload.get('shows') if isinstance(payload, dict) else None
+        if (not isinstance(rows, list)
+                or not all(isinstance(row, dict) for row in rows)):
+            return jsonify({
+                'success': False,
+                'message': 'expected {"shows": [{...}, ...]}'
+            }), 400
+        if len(rows) > max_rows:
+            return jsonify({
+                'success': False,
+                'message': 'at most {} shows per batch'.format(max_rows)
+            }), 400
+        saved, results = schedule_shows(rows)
+        for result in results:
+            if hasattr(result['start_time'], 'isoformat'):
+                result['start_time'] = result['start_time'].isoformat()
+        if not saved:
+            idempotency.release()
+        return jsonify({'success': saved, 'results': results}), \
+            201 if saved else 400
+
+    form = ShowBatchForm()
+    rows = parse_show_lines(form.shows.data or '')
+    if len(rows) > max_rows:
+        idempotency.release()
+        flash('At most {} shows can be listed at once.'.format(max_rows))
+        return render_template('forms/new_show_batch.html', form=form)
+    saved, results = schedule_shows(rows)
+    form.renew_idempotency_key()
+    if saved:
+        flash('{} shows were successfully listed'.format(len(results)))
+    else:
+        idempotency.release()
+        flash('An error occurred. No shows from this batch were listed.')
+    return render_template('forms/new_show_batch.html',
+                           form=form,
+                           results=results)
+
+
+@bp.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-        ))
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+app = create_app()
 
 #----------------------------------------------------------------------------#
 # Launch.
@@ -0,0 +1,167 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+from flask import request, send_from_directory, url_for, abort
+from compression import choose_encoding
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip variants are built without it
+    brotli = None
+
+#----------------------------------------------------------------------------#
+# Bundles.
+#----------------------------------------------------------------------------#
+
+# Logical bundle name -> source files under static/, in load order.
+BUNDLES = {
+    'main.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    # Blocking, in <head>.
+    'head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ],
+    # Blocking, at the end of <body>: inline scripts may expect $.
+    'jquery.js': [
+        'js/libs/jquery-1.11.1.min.js',
+    ],
+    # Deferred, so these run after parsing, in this order.
+    'main.js': [
+        'js/script.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ],
+}
+
+# Bundles live under static/ so relative url(../fonts/...) references in the
+# stylesheets keep resolving.
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# For files without a content hash in their name (the manifest).
+REVALIDATE = 'no-cache'
+FINGERPRINTED = re.compile(r'\.[0-9a-f]{12}\.[a-z]+$')
+ENCODED = (('br', '.br'), ('gzip', '.gz'))
+
+#----------------------------------------------------------------------------#
+# Minifiers.
+#----------------------------------------------------------------------------#
+
+
+def minify_css(source):
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{}:;,>])\s*', r'\1', source)
+    return source.replace(';}', '}').strip()
+
+
+def minify_js(source):
+    # Conservative: drop whole-line comments and blank lines only, so we never
+    # have to tokenise JavaScript. Vendored libraries are already minified.
+    lines = (line.strip() for line in source.splitlines())
+    return '\n'.join(line for line in lines
+                     if line and not line.startswith('//'))
+
+
+#----------------------------------------------------------------------------#
+# Build.
+#----------------------------------------------------------------------------#
+
+
+def build_bundles(static_folder):
+    dist = os.path.join(static_folder, DIST_DIR)
+    os.makedirs(dist, exist_ok=True)
+    manifest = {}
+    for name, sources in BUNDLES.items():
+        stem, ext = os.path.splitext(name)
+        minify = minify_css if ext == '.css' else minify_js
+        parts = []
+        for source in sources:
+            with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+                text = f.read()
+            parts.append(text if '.min.' in source else minify(text))
+        # ';' keeps concatenated scripts from running into each other.
+        body = ('\n' if ext == '.css' else ';\n').join(parts).encode('utf-8')
+
+        digest = hashlib.sha256(body).hexdigest()[:12]
+        filename = '{}.{}{}'.format(stem, digest, ext)
+        path = os.path.join(dist, filename)
+        with open(path, 'wb') as f:
+            f.write(body)
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(body, 9))
+        if brotli is not None:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(body))
+        manifest[name] = filename
+
+    with open(os.path.join(dist, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST)) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+#----------------------------------------------------------------------------#
+# Flask wiring.
+#----------------------------------------------------------------------------#
+
+
+def init_app(app):
+    manifest = load_manifest(app.static_folder)
+    app.extensions['assets'] = manifest
+
+    def asset_urls(name):
+        # Hashed bundle once built; the individual source files otherwise,
+        # so development works without a build step.
+        if name in manifest:
+            return [url_for('dist_asset', filename=manifest[name])]
+        return [url_for('static', filename=f) for f in BUNDLES[name]]
+
+    app.jinja_env.globals['asset_urls'] = asset_urls
+
+    @app.route('/static/' + DIST_DIR + '/<path:filename>')
+    def dist_asset(filename):
+        directory = os.path.join(app.static_folder, DIST_DIR)
+        if not os.path.isfile(os.path.join(directory, filename)):
+            abort(404)
+        encoding = choose_encoding(
+            request.headers.get('Accept-Encoding', ''),
+            available=[coding for coding, suffix in ENCODED
+                       if os.path.isfile(
+                           os.path.join(directory, filename + suffix))])
+        if encoding:
+            response = send_from_directory(directory,
+                                           filename + dict(ENCODED)[encoding])
+            response.mimetype = ('text/css' if filename.endswith('.css')
+                                 else 'application/javascript')
+            response.headers['Content-Encoding'] = encoding
+        else:
+            response = send_from_directory(directory, filename)
+        response.headers['Cache-Control'] = (
+            IMMUTABLE if FINGERPRINTED.search(filename) else REVALIDATE)
+        response.vary.add('Accept-Encoding')
+        return response
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """Concatenate, minify and fingerprint static bundles."""
+        built = build_bundles(app.static_folder)
+        manifest.clear()
+        manifest.update(built)
+        for name, filename in sorted(built.items()):
+            print('{} -> {}/{}'.format(name, DIST_DIR, filename))
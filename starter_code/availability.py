@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+import dateutil.parser
+from flask import current_app
+
+#----------------------------------------------------------------------------#
+# Free/busy calendars.
+#----------------------------------------------------------------------------#
+
+# A show has no end time, so each one is taken to occupy SHOW_DURATION_MINUTES
+# from its start. Only shows that can overlap the requested window are read,
+# through the (artist_id, start_time) / (venue_id, start_time) indexes, so the
+# cost depends on the window and not on how many shows an artist ever played.
+
+
+def parse_window(args):
+    """Return the (start, end) window from ?start=&end= query args, as naive
+    local datetimes like Show.start_time. Raises ValueError."""
+    now = datetime.now().replace(second=0, microsecond=0)
+    max_days = current_app.config['AVAILABILITY_MAX_DAYS']
+    # Keep the default end, start - SHOW_DURATION_MINUTES and a show's end
+    # inside what datetime can represent.
+    margin = timedelta(
+        days=max(max_days, 30),
+        minutes=current_app.config['SHOW_DURATION_MINUTES'])
+    earliest, latest = datetime.min + margin, datetime.max - margin
+
+    def parse(name, default):
+        value = args.get(name)
+        if not value:
+            return default
+        try:
+            value = dateutil.parser.parse(value)
+            if value.tzinfo is not None:
+                value = value.astimezone().replace(tzinfo=None)
+        except (ValueError, OverflowError):
+            raise ValueError('{} is not a date: {!r}'.format(name, value))
+        if not earliest <= value <= latest:
+            raise ValueError('{} is out of range: {!r}'.format(
+                name, args.get(name)))
+        return value
+
+    start = parse('start', now)
+    end = parse('end', start + timedelta(days=30))
+    if end <= start:
+        raise ValueError('end must be after start')
+    if end - start > timedelta(days=max_days):
+        raise ValueError('window is longer than {} days'.format(max_days))
+    return start, end
+
+
+def merge_intervals(intervals):
+    """Merge (start, end) pairs, sorted by start, that overlap or touch."""
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(interval) for interval in merged]
+
+
+def free_intervals(busy, start, end):
+    """The gaps between merged busy intervals inside [start, end)."""
+    free = []
+    cursor = start
+    for busy_start, busy_end in busy:
+        if busy_start > cursor:
+            free.append((cursor, busy_start))
+        cursor = max(cursor, busy_end)
+    if cursor < end:
+        free.append((cursor, end))
+    return free
+
+
+def busy_intervals(db, column, owner_id, start, end):
+    from models import Show
+    duration = timedelta(
+        minutes=current_app.config['SHOW_DURATION_MINUTES'])
+    starts = db.session.query(Show.start_time).filter(
+        column == owner_id, Show.deleted_at.is_(None),
+        Show.start_time > start - duration,
+        Show.start_time < end).order_by(Show.start_time)
+    return merge_intervals((max(show_start, start),
+                            min(show_start + duration, end))
+                           for show_start, in starts)
+
+
+def calendar(db, column, owner_id, start, end):
+    busy = busy_intervals(db, column, owner_id, start, end)
+
+    def slots(intervals):
+        return [{
+            'start': slot_start.isoformat(),
+            'end': slot_end.isoformat()
+        } for slot_start, slot_end in intervals]
+
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'busy': slots(busy),
+        'free': slots(free_intervals(busy, start, end)),
+    }
@@ -0,0 +1,55 @@
+"""Bytes on the wire and CPU cost of response compression per route.
+
+Run against a seeded database (see benchmarks/seed.py):
+
+    $ python benchmarks/compression.py [--requests 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROUTES = ['/shows', '/artists', '/venues']
+
+
+def measure(client, path, encoding, requests):
+    headers = {'Accept-Encoding': encoding} if encoding else {}
+    size = 0
+    cpu = time.process_time()
+    for _ in range(requests):
+        size = len(client.get(path, headers=headers).data)
+    return size, (time.process_time() - cpu) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=20)
+    args = parser.parse_args()
+
+    from app import app
+    from compression import brotli
+    client = app.test_client()
+    cache = app.extensions['compression']
+
+    print('{:<10} {:<13} {:>10} {:>10}'.format('route', 'encoding', 'bytes',
+                                              'cpu ms'))
+    for path in ROUTES:
+        for encoding in (None, 'gzip', 'br'):
+            if encoding == 'br' and brotli is None:
+                continue
+            for label, size in (('cold', 0), ('cached', cache.size)):
+                if encoding is None and label == 'cached':
+                    continue
+                cache.size = size
+                cache._items.clear()
+                nbytes, cpu = measure(client, path, encoding, args.requests)
+                print('{:<10} {:<13} {:>10} {:>10.2f}'.format(
+                    path, '{}{}'.format(encoding or 'identity',
+                                        '' if encoding is None else
+                                        '/' + label), nbytes, cpu * 1000))
+
+
+if __name__ == '__main__':
+    main()
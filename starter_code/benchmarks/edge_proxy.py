@@ -0,0 +1,170 @@
+"""A minimal caching reverse proxy for trying edge caching locally.
+
+Caches GET responses that are public with s-maxage (or max-age), one copy
+per path and negotiated encoding (the app sends Vary: Accept-Encoding),
+reports X-Cache: HIT/MISS, and evicts entries on POST /purge with a Surrogate-Key
+header listing keys, the way the app's purge hook sends them. Not for
+production use.
+
+    $ python benchmarks/edge_proxy.py --upstream http://127.0.0.1:5000 --port 8080
+    $ SURROGATE_PURGE_URL=http://127.0.0.1:8080/purge python app.py
+"""
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+HOP_BY_HOP = {'connection', 'keep-alive', 'transfer-encoding', 'upgrade'}
+
+
+def ttl(cache_control):
+    directives = dict(
+        (part.split('=', 1) + [None])[:2]
+        for part in (p.strip() for p in cache_control.split(',')) if part)
+    if 'public' not in directives or 'no-store' in directives:
+        return 0
+    for name in ('s-maxage', 'max-age'):
+        if directives.get(name, '').isdigit():
+            return int(directives[name])
+    return 0
+
+
+def negotiated_encoding(accept_encoding):
+    # Normalised the way Varnish does, so there is one entry per encoding
+    # rather than one per Accept-Encoding spelling.
+    codings = {
+        item.split(';')[0].strip().lower()
+        for item in accept_encoding.split(',')
+    }
+    for coding in ('br', 'gzip'):
+        if coding in codings:
+            return coding
+    return 'identity'
+
+
+class EdgeCache(object):
+    def __init__(self, key_header):
+        self.key_header = key_header
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.purged = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry['expires'] > time.monotonic():
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return None
+
+    def put(self, key, status, headers, body):
+        seconds = ttl(headers.get('Cache-Control', ''))
+        if status != 200 or not seconds or 'Set-Cookie' in headers:
+            return
+        with self.lock:
+            self.entries[key] = {
+                'status': status,
+                'headers': headers,
+                'body': body,
+                'keys': set(headers.get(self.key_header, '').split()),
+                'expires': time.monotonic() + seconds,
+            }
+
+    def purge(self, keys):
+        with self.lock:
+            stale = [
+                key for key, entry in self.entries.items()
+                if entry['keys'] & keys
+            ]
+            for key in stale:
+                del self.entries[key]
+            self.purged += len(stale)
+            return stale
+
+
+def make_handler(upstream, cache):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def send(self, status, headers, body, state):
+            self.send_response(status)
+            for name, value in headers.items():
+                if name.lower() not in HOP_BY_HOP | {'content-length'}:
+                    self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('X-Cache', state)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def forward(self, encoding=None):
+            length = int(self.headers.get('Content-Length') or 0)
+            data = self.rfile.read(length) if length else None
+            headers = {
+                name: value
+                for name, value in self.headers.items()
+                if name.lower() not in HOP_BY_HOP | {'host'}
+            }
+            if encoding is not None:
+                headers['Accept-Encoding'] = encoding
+            request = Request(upstream + self.path,
+                              data=data,
+                              headers=headers,
+                              method=self.command)
+            try:
+                with urlopen(request) as response:
+                    return response.status, dict(response.headers), \
+                        response.read()
+            except HTTPError as e:
+                return e.code, dict(e.headers), e.read()
+
+        def do_GET(self):
+            encoding = negotiated_encoding(
+                self.headers.get('Accept-Encoding', ''))
+            key = (self.path, encoding)
+            entry = cache.get(key)
+            if entry is not None:
+                return self.send(entry['status'], entry['headers'],
+                                 entry['body'], 'HIT')
+            status, headers, body = self.forward(encoding)
+            cache.put(key, status, headers, body)
+            self.send(status, headers, body, 'MISS')
+
+        def do_POST(self):
+            if self.path == '/purge':
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                keys = set(self.headers.get(cache.key_header, '').split())
+                stale = cache.purge(keys)
+                body = '{}\n'.format(' '.join(
+                    sorted('{} ({})'.format(*key) for key in stale))).encode()
+                return self.send(200, {'Content-Type': 'text/plain'}, body,
+                                 'PURGE')
+            self.send(*self.forward(), 'PASS')
+
+        do_DELETE = do_POST
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--upstream', default='http://127.0.0.1:5000')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--key-header', default='Surrogate-Key')
+    args = parser.parse_args()
+    cache = EdgeCache(args.key_header)
+    server = ThreadingHTTPServer(('127.0.0.1', args.port),
+                                 make_handler(args.upstream.rstrip('/'),
+                                              cache))
+    print('caching {} on port {}'.format(args.upstream, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print('hits {} misses {} purged {}'.format(cache.hits, cache.misses,
+                                                  cache.purged))
+
+
+if __name__ == '__main__':
+    main()
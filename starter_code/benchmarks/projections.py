@@ -0,0 +1,57 @@
+"""Memory and time per 10k rows: full ORM entities vs column projections.
+
+Uses its own SQLite database so it never touches your data:
+
+    $ python benchmarks/projections.py [--rows 10000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return len(rows), elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'projections.db')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + path
+    os.environ.pop('DATABASE_REPLICA_URLS', None)
+    from app import app
+    from models import db, Artist
+    from benchmarks.seed import seed
+
+    with app.app_context():
+        seed(db, artists=args.rows, venues=10, shows=0)
+        paths = [
+            ('entities', lambda: Artist.active().all()),
+            ('projection', lambda: Artist.list_items()),
+        ]
+        scale = 10000.0 / args.rows
+        print('{:<12} {:>8} {:>12} {:>12}'.format('path', 'rows',
+                                                   'ms/10k', 'KiB/10k'))
+        for name, fn in paths:
+            db.session.remove()
+            count, elapsed, peak = measure(fn)
+            print('{:<12} {:>8} {:>12.2f} {:>12.1f}'.format(
+                name, count, elapsed * 1000 * scale, peak / 1024.0 * scale))
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
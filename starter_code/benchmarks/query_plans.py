@@ -0,0 +1,167 @@
+"""Query-count and query-plan checks for the hot detail and list pages.
+
+Seeds a catalogue, requests each route in ROUTES while recording every SQL
+statement it sends, then fails (exit status 1) when a route sends more
+statements than its budget, which is how N+1 regressions show up, or when
+EXPLAIN shows a statement scanning the whole Show table.
+
+Uses its own SQLite database by default. Pass --database-url to check plans
+on PostgreSQL; that database is dropped and re-seeded:
+
+    $ python benchmarks/query_plans.py [--shows 20000]
+    $ python benchmarks/query_plans.py --database-url postgresql://localhost/fyyur_plans
+
+tests/test_query_plans.py runs the same checks under pytest.
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# (url template, most statements the route may send). {venue_id} and
+# {artist_id} are filled in with the busiest venue and artist.
+ROUTES = [
+    ('/venues', 1),
+    ('/venues/{venue_id}', 3),
+    ('/artists/{artist_id}', 3),
+    ('/artists', 1),
+    ('/artists?sort=upcoming&state=CA', 1),
+    ('/venues/{venue_id}/availability', 2),
+    ('/artists/{artist_id}/availability', 2),
+]
+
+# Show is "Show" on SQLite and "Show" or its "Show_yYYYYmMM" partitions on
+# PostgreSQL.
+SHOW_TABLE = re.compile(r'^Show(_y\d{4}m\d{2}|_default)?$')
+SQLITE_SCAN = re.compile(r'^SCAN (TABLE )?"?(\w+)"?')
+
+
+class StatementLog(object):
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context,
+                 executemany):
+        self.statements.append((statement, parameters))
+
+
+def seq_scans_sqlite(cursor, statement, parameters):
+    cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+    for row in cursor.fetchall():
+        match = SQLITE_SCAN.match(row[-1])
+        if match and SHOW_TABLE.match(match.group(2)):
+            yield row[-1]
+
+
+def seq_scans_postgresql(cursor, statement, parameters):
+    cursor.execute('EXPLAIN (FORMAT JSON) ' + statement, parameters)
+    plan = cursor.fetchone()[0]
+    nodes = [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        nodes.extend(node.get('Plans', []))
+        if (node['Node Type'] == 'Seq Scan'
+                and SHOW_TABLE.match(node.get('Relation Name', ''))):
+            yield 'Seq Scan on {}'.format(node['Relation Name'])
+
+
+def seq_scans_for(engine):
+    if engine.dialect.name == 'postgresql':
+        return seq_scans_postgresql
+    return seq_scans_sqlite
+
+
+def check_route(client, engine, url, budget):
+    """Request url and return (statements it sent, problems found)."""
+    from sqlalchemy import event
+    seq_scans = seq_scans_for(engine)
+    log = StatementLog()
+    event.listen(engine, 'before_cursor_execute', log)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', log)
+    problems = []
+    if response.status_code != 200:
+        problems.append('HTTP {}'.format(response.status_code))
+    if len(log.statements) > budget:
+        problems.append('{} queries, budget {}'.format(len(log.statements),
+                                                      budget))
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        for statement, parameters in log.statements:
+            for scan in seq_scans(cursor, statement, parameters):
+                problems.append('{}:\n    {}'.format(
+                    scan, ' '.join(statement.split())))
+        raw.rollback()
+    finally:
+        raw.close()
+    return len(log.statements), problems
+
+
+def busiest_ids(db):
+    from models import Show
+    return {
+        'venue_id': busiest(db, Show.venue_id),
+        'artist_id': busiest(db, Show.artist_id),
+    }
+
+
+def busiest(db, column):
+    from sqlalchemy import func
+    return db.session.query(column).group_by(column).order_by(
+        func.count().desc()).limit(1).scalar()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url')
+    parser.add_argument('--artists', type=int, default=500)
+    parser.add_argument('--venues', type=int, default=100)
+    parser.add_argument('--shows', type=int, default=20000)
+    args = parser.parse_args()
+
+    path = None
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        path = os.path.join(tempfile.mkdtemp(), 'query_plans.db')
+        os.environ['DATABASE_URL'] = 'sqlite:///' + path
+    os.environ.pop('DATABASE_REPLICA_URLS', None)
+    from app import app
+    from models import db
+    from benchmarks.seed import seed
+
+    app.config['RATELIMIT_ENABLED'] = False
+    failures = []
+    with app.app_context():
+        seed(db, args.artists, args.venues, args.shows)
+        engine = db.engine
+        if engine.dialect.name == 'postgresql':
+            db.session.execute('ANALYZE "Show"')
+            db.session.commit()
+        ids = busiest_ids(db)
+        db.session.remove()
+
+        client = app.test_client()
+        print('{:<36} {:>8} {:>8}  {}'.format('route', 'queries', 'budget',
+                                             'status'))
+        for template, budget in ROUTES:
+            url = template.format(**ids)
+            count, problems = check_route(client, engine, url, budget)
+            print('{:<36} {:>8} {:>8}  {}'.format(template, count, budget,
+                                                 'FAIL' if problems else 'ok'))
+            for problem in problems:
+                print('  ' + problem)
+            failures.extend(problems)
+    if path:
+        os.remove(path)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Seed a database with a synthetic catalogue for benchmarks.
+
+    $ DATABASE_URL=sqlite:////tmp/fyyur.db python benchmarks/seed.py --shows 5000
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'),
+          ('Seattle', 'WA'), ('Chicago', 'IL')]
+GENRES = ['Jazz', 'Rock', 'Folk', 'Blues', 'Hip-Hop', 'Classical']
+
+
+def seed(db, artists=200, venues=50, shows=2000, rng=None):
+    from models import Artist, Venue, Show
+    rng = rng or random.Random(1)
+    db.drop_all()
+    db.create_all()
+    db.session.bulk_insert_mappings(Venue, [{
+        'name': 'Venue {}'.format(i),
+        'city': rng.choice(CITIES)[0],
+        'state': rng.choice(CITIES)[1],
+        'address': '{} Main St'.format(i),
+        'phone': '555-555-{:04d}'.format(i % 10000),
+        'image_link': 'https://example.com/venue/{}.jpg'.format(i),
+        'seeking_talent': bool(i % 2),
+    } for i in range(1, venues + 1)])
+    db.session.bulk_insert_mappings(Artist, [{
+        'name': 'Artist {}'.format(i),
+        'city': rng.choice(CITIES)[0],
+        'state': rng.choice(CITIES)[1],
+        'phone': '555-555-{:04d}'.format(i % 10000),
+        'genres': ','.join(rng.sample(GENRES, 2)),
+        'image_link': 'https://example.com/artist/{}.jpg'.format(i),
+        'seeking_venue': bool(i % 3),
+    } for i in range(1, artists + 1)])
+    now = datetime.now().replace(microsecond=0)
+    db.session.bulk_insert_mappings(Show, [{
+        'artist_id': rng.randint(1, artists),
+        'venue_id': rng.randint(1, venues),
+        'start_time': now + timedelta(hours=rng.randint(-24 * 365, 24 * 180)),
+    } for _ in range(shows)])
+    Artist.refresh_upcoming_shows()
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--artists', type=int, default=200)
+    parser.add_argument('--venues', type=int, default=50)
+    parser.add_argument('--shows', type=int, default=2000)
+    args = parser.parse_args()
+
+    from app import app
+    from models import db
+    with app.app_context():
+        seed(db, args.artists, args.venues, args.shows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Cold-start benchmark: app import time and first-request latency.
+
+Each sample runs in a fresh interpreter with its own empty
+TEMPLATE_CACHE_DIR, so nothing is shared between runs. The "cached" rows
+reuse a bytecode cache filled by an earlier, untimed process, the way a
+restarted worker finds it.
+
+    $ python benchmarks/startup.py [--runs 5] [--path /]
+"""
+import argparse
+import json
+import os
+import statistics
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = '''
+import json, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+client = app.app.test_client()
+t2 = time.perf_counter()
+client.get(sys.argv[1])
+t3 = time.perf_counter()
+client.get(sys.argv[1])
+t4 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "first": t3 - t2, "second": t4 - t3}))
+'''
+
+
+def sample(path, warmup, cache_dir):
+    env = dict(os.environ,
+               TEMPLATE_WARMUP='1' if warmup else '0',
+               TEMPLATE_CACHE_DIR=cache_dir)
+    out = subprocess.check_output([sys.executable, '-c', PROBE, path],
+                                  cwd=ROOT,
+                                  env=env)
+    return json.loads(out.decode().strip().splitlines()[-1])
+
+
+def fresh_sample(path, warmup, cached):
+    cache_dir = tempfile.mkdtemp(prefix='fyyur-jinja-')
+    try:
+        if cached:
+            sample(path, True, cache_dir)
+        return sample(path, warmup, cache_dir)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--path', default='/')
+    args = parser.parse_args()
+
+    for warmup, cached in ((False, False), (True, False), (True, True)):
+        runs = [
+            fresh_sample(args.path, warmup, cached) for _ in range(args.runs)
+        ]
+        print('warmup={} bytecode cache={}'.format(
+            'on' if warmup else 'off', 'filled' if cached else 'empty'))
+        for key in ('import', 'first', 'second'):
+            print('  {:<7} median {:8.2f} ms'.format(
+                key, statistics.median(r[key] for r in runs) * 1000))
+
+
+if __name__ == '__main__':
+    main()
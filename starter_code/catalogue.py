@@ -0,0 +1,263 @@
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from sqlalchemy import func
+
+#----------------------------------------------------------------------------#
+# Catalogue snapshot.
+#----------------------------------------------------------------------------#
+
+# Read-only copy of the Artist and Venue fields that tiles and search results
+# need, in one file that every worker maps into memory; the OS keeps a single
+# copy in its page cache however many workers there are. Layout:
+#
+#   header   MAGIC, artist count, venue count, database fingerprint,
+#            last Outbox id when the snapshot was built
+#   index    per kind, (id, offset, length) triples sorted by id
+#   records  UTF-8 name, city, state, image_link joined by NUL
+#
+# The file is rebuilt by `flask refresh-catalogue` and in the background after
+# every venue/artist write, and replaced atomically; workers notice a new file
+# within CATALOGUE_CHECK_INTERVAL seconds. Ids missing from it (rows newer
+# than the snapshot) are read from the database, and so are rows the Outbox
+# shows were written after the snapshot was built, so lookups and search
+# never return a stale copy.
+
+MAGIC = b'FYYURCT2'
+HEADER = struct.Struct('<8sII16sQ')
+ENTRY = struct.Struct('<III')
+
+CatalogueEntry = namedtuple('CatalogueEntry',
+                            ['id', 'name', 'city', 'state', 'image_link'])
+
+
+def fingerprint(uri):
+    return hashlib.sha256(uri.encode('utf-8')).digest()[:16]
+
+
+def write_snapshot(path, fingerprint, outbox_position, artists, venues):
+    """artists and venues are CatalogueEntry sequences sorted by id."""
+    kinds = (artists, venues)
+    offset = HEADER.size + ENTRY.size * sum(len(rows) for rows in kinds)
+    index, records = [], []
+    for rows in kinds:
+        for row in rows:
+            record = '\0'.join(field or '' for field in row[1:]).encode('utf-8')
+            index.append(ENTRY.pack(row.id, offset, len(record)))
+            records.append(record)
+            offset += len(record)
+    # Unique per process so concurrent refreshes don't clobber each other's
+    # temporary file; the rename is atomic.
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(
+            HEADER.pack(MAGIC, len(artists), len(venues), fingerprint,
+                        outbox_position))
+        f.writelines(index)
+        f.writelines(records)
+    os.replace(tmp, path)
+
+
+class Snapshot(object):
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.stat = os.fstat(f.fileno())
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.buffer) < HEADER.size:
+            raise ValueError('{} is not a catalogue snapshot'.format(path))
+        (magic, artists, venues, self.fingerprint,
+         self.outbox_position) = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise ValueError('{} is not a catalogue snapshot'.format(path))
+        self.sections = {
+            'artist': (HEADER.size, artists),
+            'venue': (HEADER.size + ENTRY.size * artists, venues),
+        }
+
+    def _id(self, kind, i):
+        return ENTRY.unpack_from(self.buffer,
+                                 self.sections[kind][0] + ENTRY.size * i)[0]
+
+    def _record(self, kind, i):
+        start = self.sections[kind][0]
+        id, offset, length = ENTRY.unpack_from(self.buffer,
+                                               start + ENTRY.size * i)
+        return id, self.buffer[offset:offset + length]
+
+    def get(self, kind, id):
+        # Binary search straight over the mapped index.
+        lo, hi = 0, self.sections[kind][1]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._id(kind, mid) < id:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self.sections[kind][1] or self._id(kind, lo) != id:
+            return None
+        id, record = self._record(kind, lo)
+        return CatalogueEntry(id, *record.decode('utf-8').split('\0'))
+
+    def names(self, kind):
+        for i in range(self.sections[kind][1]):
+            id, record = self._record(kind, i)
+            yield id, record.split(b'\0', 1)[0].decode('utf-8')
+
+
+class Catalogue(object):
+    def __init__(self):
+        self.db = None
+        self.executor = None
+        self._snapshot = None
+        self._checked_at = None
+        self._pending = False
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db):
+        app.config.setdefault('CATALOGUE_PATH',
+                              os.path.join(app.instance_path, 'catalogue.bin'))
+        app.config.setdefault('CATALOGUE_CHECK_INTERVAL', 1.0)
+        self.db = db
+        self.executor = ThreadPoolExecutor(1)
+        app.extensions['catalogue'] = self
+
+        @app.cli.command('refresh-catalogue')
+        def refresh_catalogue_command():
+            """Rebuild the shared artist/venue catalogue snapshot."""
+            artists, venues = self.refresh()
+            print('{} artists, {} venues -> {}'.format(
+                artists, venues, app.config['CATALOGUE_PATH']))
+
+    def refresh(self):
+        from models import Artist, OutboxEvent, Venue
+        config = current_app.config
+        os.makedirs(os.path.dirname(config['CATALOGUE_PATH']), exist_ok=True)
+        # Read first, so every change after it is past the stored position.
+        position = self.db.session.query(func.max(OutboxEvent.id)).scalar()
+        rows = []
+        for model in (Artist, Venue):
+            query = self.db.session.query(
+                model.id, model.name, model.city, model.state,
+                model.image_link).filter(model.deleted_at.is_(None)).order_by(
+                    model.id)
+            rows.append([CatalogueEntry._make(row) for row in query])
+        write_snapshot(config['CATALOGUE_PATH'],
+                       fingerprint(config['SQLALCHEMY_DATABASE_URI']),
+                       position or 0, *rows)
+        return len(rows[0]), len(rows[1])
+
+    def refresh_soon(self):
+        # Writes arriving while a refresh runs schedule exactly one more.
+        with self._lock:
+            if self._pending:
+                return
+            self._pending = True
+        self.executor.submit(self._refresh_in_background,
+                             current_app._get_current_object())
+
+    def _refresh_in_background(self, app):
+        with self._lock:
+            self._pending = False
+        with app.app_context():
+            try:
+                self.refresh()
+            except Exception:
+                app.logger.exception('catalogue refresh failed')
+            finally:
+                self.db.session.remove()
+
+    def snapshot(self):
+        config = current_app.config
+        now = time.monotonic()
+        if (self._checked_at is not None and
+                now - self._checked_at < config['CATALOGUE_CHECK_INTERVAL']):
+            return self._snapshot
+        self._checked_at = now
+        path = config['CATALOGUE_PATH']
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._snapshot = None
+            return None
+        current = self._snapshot
+        if current is None or (stat.st_ino, stat.st_mtime_ns) != (
+                current.stat.st_ino, current.stat.st_mtime_ns):
+            try:
+                current = Snapshot(path)
+            except ValueError:
+                # Another format; the next refresh replaces it.
+                self._snapshot = None
+                return None
+            if current.fingerprint != fingerprint(
+                    config['SQLALCHEMY_DATABASE_URI']):
+                # Built from another database.
+                current = None
+            self._snapshot = current
+        return current
+
+    def changed(self, snapshot, kind, ids=None):
+        """Ids of kind the Outbox shows were written after snapshot was built
+        (optionally only among ids)."""
+        from models import OutboxEvent
+        query = self.db.session.query(OutboxEvent.entity_id).filter(
+            OutboxEvent.id > snapshot.outbox_position,
+            OutboxEvent.entity == kind)
+        if ids is not None:
+            query = query.filter(OutboxEvent.entity_id.in_(ids))
+        return {id for id, in query}
+
+    def lookup(self, kind, ids):
+        """Map each active id to its CatalogueEntry, reading ids the
+        snapshot doesn't have, or has an older copy of, from the database."""
+        from models import Artist, Venue
+        ids = set(ids)
+        snapshot = self.snapshot()
+        changed = self.changed(snapshot, kind, ids) if (
+            snapshot is not None and ids) else set()
+        found, missing = {}, set()
+        for id in ids:
+            entry = snapshot.get(kind, id) if snapshot is not None else None
+            if entry is None or id in changed:
+                missing.add(id)
+            else:
+                found[id] = entry
+        if missing:
+            model = Artist if kind == 'artist' else Venue
+            query = self.db.session.query(
+                model.id, model.name, model.city, model.state,
+                model.image_link).filter(model.id.in_(missing),
+                                         model.deleted_at.is_(None))
+            found.update((row.id, CatalogueEntry._make(row)) for row in query)
+        return found
+
+    def search(self, kind, term):
+        """ListItems whose name contains term, ignoring case, or None when
+        there is no snapshot to search. Rows written since the snapshot was
+        built are matched against the database instead."""
+        from models import Artist, ListItem, Venue
+        snapshot = self.snapshot()
+        if snapshot is None:
+            return None
+        term = term.casefold()
+        changed = self.changed(snapshot, kind)
+        found = {
+            id: ListItem(id, name)
+            for id, name in snapshot.names(kind)
+            if id not in changed and term in name.casefold()
+        }
+        if changed:
+            model = Artist if kind == 'artist' else Venue
+            query = self.db.session.query(model.id, model.name).filter(
+                model.id.in_(changed), model.deleted_at.is_(None))
+            found.update((row.id, ListItem._make(row)) for row in query
+                         if term in (row.name or '').casefold())
+        return [found[id] for id in sorted(found)]
+
+
+catalogue = Catalogue()
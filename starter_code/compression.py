@@ -0,0 +1,171 @@
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only without it
+    brotli = None
+
+#----------------------------------------------------------------------------#
+# Response compression.
+#----------------------------------------------------------------------------#
+
+# Binary formats gain nothing from a second compression pass.
+COMPRESSIBLE = {
+    'text/html', 'text/css', 'text/plain', 'text/xml', 'text/event-stream',
+    'application/javascript', 'application/json', 'application/xml',
+    'image/svg+xml'
+}
+
+
+def choose_encoding(accept_encoding, available=None):
+    """The first coding in available (default: br when brotli is installed,
+    then gzip) that accept_encoding allows with q > 0, or None."""
+    if available is None:
+        available = ('br', 'gzip') if brotli is not None else ('gzip', )
+    accepted = {}
+    for item in accept_encoding.split(','):
+        parts = item.strip().split(';')
+        coding = parts[0].strip().lower()
+        q = 1.0
+        for param in parts[1:]:
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding:
+            accepted[coding] = q
+    for coding in available:
+        if accepted.get(coding, accepted.get('*', 0)) > 0:
+            return coding
+    return None
+
+
+def identity_etag(etag):
+    """The ETag of the uncompressed representation that etag (as sent back
+    in If-None-Match) was derived from."""
+    base, _, encoding = etag.rpartition('-')
+    return base if base and encoding in ('br', 'gzip') else etag
+
+
+def _gzip_compressor(level):
+    # wbits=31 produces a gzip container rather than a raw zlib stream.
+    return zlib.compressobj(level, zlib.DEFLATED, 31)
+
+
+class _BrotliCompressor(object):
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=min(level, 11))
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self, mode=None):
+        if mode == zlib.Z_SYNC_FLUSH:
+            return self._compressor.flush()
+        return self._compressor.finish()
+
+
+def compressor(encoding, level):
+    if encoding == 'br':
+        return _BrotliCompressor(level)
+    return _gzip_compressor(level)
+
+
+def compress_body(encoding, body, level):
+    c = compressor(encoding, level)
+    return c.compress(body) + c.flush()
+
+
+def compress_stream(encoding, chunks, level):
+    # Sync-flush after every chunk so streamed output (e.g. SSE) reaches the
+    # client as soon as the view yields it.
+    c = compressor(encoding, level)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = c.compress(chunk) + c.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield c.flush()
+
+
+class CompressedCache(object):
+    """Small LRU of compressed bodies keyed by content digest and encoding,
+    so an unchanged (or cached) page is compressed only once. Shared by the
+    worker's threads, hence the lock."""
+
+    def __init__(self, size):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if not self.size:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+
+def init_app(app):
+    app.config.setdefault('COMPRESS_ENABLED', True)
+    app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+    app.config.setdefault('COMPRESS_CACHE_SIZE', 128)
+    cache = CompressedCache(app.config['COMPRESS_CACHE_SIZE'])
+    app.extensions['compression'] = cache
+
+    @app.after_request
+    def compress_response(response):
+        if not app.config['COMPRESS_ENABLED']:
+            return response
+        # Files sent straight from disk (including prebuilt .gz/.br assets)
+        # and responses that are already encoded are left alone.
+        if (response.direct_passthrough or response.status_code < 200
+                or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE):
+            return response
+
+        encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+        response.vary.add('Accept-Encoding')
+        if encoding is None:
+            return response
+
+        level = app.config['COMPRESS_LEVEL']
+        if response.is_streamed:
+            response.response = compress_stream(encoding, response.response,
+                                                level)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if len(body) < app.config['COMPRESS_MIN_SIZE']:
+                return response
+            key = (hashlib.sha1(body).digest(), encoding)
+            compressed = cache.get(key)
+            if compressed is None:
+                compressed = compress_body(encoding, body, level)
+                cache.set(key, compressed)
+            response.set_data(compressed)
+
+        response.headers['Content-Encoding'] = encoding
+        if response.headers.get('ETag'):
+            # A different representation must not share the identity ETag.
+            etag, weak = response.get_etag()
+            response.set_etag('{}-{}'.format(etag, encoding), weak)
+        return response
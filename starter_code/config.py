@@ -9,5 +9,75 @@ DEBUG = True
 # Connect to the database
 
 # TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgres://rawan@localhost:5432/fyyur'
-SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+SQLALCHEMY_DATABASE_URI = os.environ.get(
+    'DATABASE_URL', 'postgres://rawan@localhost:5432/fyyur')
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Read replicas for GET requests, comma separated. A client is kept on the
+# primary for SQLALCHEMY_REPLICA_PIN_SECONDS after it writes.
+SQLALCHEMY_REPLICA_URIS = [
+    uri for uri in os.environ.get('DATABASE_REPLICA_URLS', '').split(',')
+    if uri
+]
+SQLALCHEMY_REPLICA_PIN_SECONDS = 5
+
+# Token-bucket rate limits per client IP and endpoint:
+# scope -> (tokens refilled per second, burst size).
+RATELIMITS = {
+    'search': (1.0, 10),
+    'write': (0.5, 10),
+}
+# Reverse proxies in front of the app that append to X-Forwarded-For; the
+# client IP rate limits use is taken that many hops back. 0 trusts none.
+PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', '0'))
+# memory:// (one worker), sqlite:///path (workers on one host) or redis://
+RATELIMIT_STORAGE_URI = os.environ.get('RATELIMIT_STORAGE_URI', 'memory://')
+# Searches running longer than this are cancelled with a 503.
+SEARCH_QUERY_BUDGET_MS = 2000
+
+# Opt-in request profiling: send the X-Profile header with PROFILE_TOKEN as
+# its value (the header is ignored while no token is set) or sample a
+# fraction of requests. Output goes to PROFILE_DIR.
+PROFILE_ENABLED = os.environ.get('PROFILE_ENABLED', '0') == '1'
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+
+# Templates: compiled bytecode is cached on disk so new workers skip the
+# Jinja compile step, and every template is compiled once at boot.
+TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR',
+                                    os.path.join(basedir, '.jinja_cache'))
+TEMPLATE_WARMUP = os.environ.get('TEMPLATE_WARMUP', '1') == '1'
+
+# Availability calendars: shows are assumed to last this long, and one
+# request may cover at most AVAILABILITY_MAX_DAYS.
+SHOW_DURATION_MINUTES = 180
+AVAILABILITY_MAX_DAYS = 92
+
+# Most shows one /shows/batch request may list.
+SHOW_BATCH_MAX_ROWS = 200
+
+# Artists per page on /artists.
+ARTISTS_PAGE_SIZE = 50
+
+# Edge caching: Cache-Control per policy (see edge_cache.py). Browsers
+# revalidate after max-age; the CDN keeps pages for s-maxage and is purged
+# by surrogate key on writes, so it can hold them long. Browsers can't be
+# purged, so list and detail pages are revalidated (by ETag) every time.
+CACHE_POLICIES = {
+    'page': 'public, max-age=300, s-maxage=86400',
+    'list': 'public, max-age=0, s-maxage=86400, '
+            'stale-while-revalidate=60, stale-if-error=86400',
+    'detail': 'public, max-age=0, s-maxage=86400, '
+              'stale-while-revalidate=60, stale-if-error=86400',
+    'availability': 'public, max-age=0, s-maxage=3600, stale-if-error=3600',
+}
+# Surrogate keys of changed rows are POSTed here (in SURROGATE_KEY_HEADER)
+# after each write; unset disables purging.
+SURROGATE_PURGE_URL = os.environ.get('SURROGATE_PURGE_URL')
+
+# Outbox relay: rows per NDJSON batch, how long a gap in Outbox ids is
+# waited on (an uncommitted transaction) before the relay moves past it, and
+# how long skipped ids are still re-checked before they count as rolled back.
+OUTBOX_BATCH_SIZE = 500
+OUTBOX_GAP_TIMEOUT = 30
+OUTBOX_SKIPPED_TTL = 60 * 60
@@ -0,0 +1,123 @@
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import Request, urlopen
+import click
+from flask import current_app, g, request, session
+
+from compression import identity_etag
+
+#----------------------------------------------------------------------------#
+# Edge caching.
+#----------------------------------------------------------------------------#
+
+# Views opt in with @edge_cache.cache(policy), where CACHE_POLICIES maps the
+# policy to a Cache-Control value, and tag their response with the surrogate
+# keys of what they render (edge_cache.tag('artist-1', 'venue-2')). Keys are
+# sent in SURROGATE_KEY_HEADER. After a commit, write views call
+# edge_cache.purge(...) with the keys they changed, which POSTs them in the
+# same header to SURROGATE_PURGE_URL from a background thread (the shape of a
+# Fastly batch purge; Varnish xkey or a small proxy can accept the same).
+#
+# Keys: 'artists', 'venues', 'shows' for the list pages, 'artist-<id>',
+# 'venue-<id>', 'show-<id>' for the entities a page shows.
+
+
+def entity_keys(kind, ids):
+    return ['{}-{}'.format(kind, id) for id in ids]
+
+
+def show_keys(rows):
+    """Keys to purge when shows (dicts with artist_id and venue_id) are
+    listed: /shows, upcoming counts on /artists and both detail pages."""
+    return (['shows', 'artists'] +
+            entity_keys('artist', {int(row['artist_id']) for row in rows}) +
+            entity_keys('venue', {int(row['venue_id']) for row in rows}))
+
+
+class EdgeCache(object):
+    def __init__(self):
+        self.executor = None
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_POLICIES', {})
+        app.config.setdefault('SURROGATE_KEY_HEADER', 'Surrogate-Key')
+        app.config.setdefault('SURROGATE_PURGE_URL', None)
+        app.config.setdefault('SURROGATE_PURGE_HEADERS', {})
+        app.config.setdefault('SURROGATE_PURGE_TIMEOUT', 5)
+        self.executor = ThreadPoolExecutor(1)
+        app.extensions['edge_cache'] = self
+        app.after_request(self._set_headers)
+
+        @app.cli.command('purge-cache')
+        @click.argument('keys', nargs=-1, required=True)
+        def purge_cache_command(keys):
+            """Purge surrogate KEYS from the edge cache."""
+            if not app.config['SURROGATE_PURGE_URL']:
+                raise click.UsageError('SURROGATE_PURGE_URL is not set')
+            self._send(app, keys)
+
+    def cache(self, policy):
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapped(*args, **kwargs):
+                g.cache_policy = policy
+                return view(*args, **kwargs)
+
+            return wrapped
+
+        return decorator
+
+    def tag(self, *keys):
+        if 'surrogate_keys' not in g:
+            g.surrogate_keys = set()
+        g.surrogate_keys.update(keys)
+
+    def _set_headers(self, response):
+        policy = g.get('cache_policy')
+        if (policy is None or request.method not in ('GET', 'HEAD')
+                or response.status_code != 200 or response.is_streamed):
+            return response
+        # The session cookie is only written after every after_request hook
+        # has run, so check whether it will be: reading flashes modifies the
+        # session, and a page showing them is for this client only.
+        if session.modified or 'Set-Cookie' in response.headers:
+            response.headers['Cache-Control'] = 'private, no-store'
+            return response
+        config = current_app.config
+        response.headers['Cache-Control'] = config['CACHE_POLICIES'][policy]
+        keys = g.get('surrogate_keys')
+        if keys:
+            response.headers[config['SURROGATE_KEY_HEADER']] = ' '.join(
+                sorted(keys))
+        # Weak: compression may re-encode the body after this hook, and
+        # then appends the encoding to the ETag. Clients send that tag back,
+        # so compare it without the suffix and echo it on the 304
+        # (compression leaves 304s alone).
+        response.add_etag(weak=True)
+        etag, _ = response.get_etag()
+        for sent in request.if_none_match.as_set(include_weak=True):
+            if identity_etag(sent) == etag:
+                response.set_etag(sent, weak=True)
+                break
+        return response.make_conditional(request)
+
+    def purge(self, *keys):
+        app = current_app._get_current_object()
+        if keys and app.config['SURROGATE_PURGE_URL']:
+            self.executor.submit(self._send, app, keys)
+
+    def _send(self, app, keys):
+        config = app.config
+        headers = dict(config['SURROGATE_PURGE_HEADERS'])
+        headers[config['SURROGATE_KEY_HEADER']] = ' '.join(sorted(set(keys)))
+        try:
+            urlopen(Request(config['SURROGATE_PURGE_URL'],
+                            data=b'',
+                            headers=headers,
+                            method='POST'),
+                    timeout=config['SURROGATE_PURGE_TIMEOUT']).close()
+        except OSError:
+            app.logger.exception('edge cache purge failed for %s', keys)
+
+
+edge_cache = EdgeCache()
@@ -0,0 +1,200 @@
+import json
+import queue
+import select
+import threading
+import time
+import dateutil.parser
+from flask import current_app, render_template
+from catalogue import catalogue
+
+#----------------------------------------------------------------------------#
+# New-show events.
+#----------------------------------------------------------------------------#
+
+# PostgreSQL: an AFTER INSERT trigger on "Show" sends pg_notify(CHANNEL, row)
+# (see migrations) and one listener thread per worker fans it out to the
+# connected /shows/stream clients. Other databases (tests, SQLite) fall back
+# to publishing in-process right after the view commits.
+CHANNEL = 'new_show'
+
+
+class Broker(object):
+    """In-process pub/sub: every subscriber gets its own bounded queue."""
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        q = queue.Queue(self.queue_size)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def publish(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                # A client this far behind is dropped rather than
+                # buffering without bound.
+                self.unsubscribe(q)
+
+    def is_subscribed(self, q):
+        return q in self._subscribers
+
+    def __len__(self):
+        return len(self._subscribers)
+
+
+class PostgresListener(threading.Thread):
+    # Seconds to wait before reconnecting after the connection fails.
+    RETRY_AFTER = 5
+
+    def __init__(self, app, db, broker):
+        threading.Thread.__init__(self, name='fyyur-listen', daemon=True)
+        self.app = app
+        self.db = db
+        self.broker = broker
+
+    def run(self):
+        # Runs for the life of the process: a dropped connection is logged
+        # and reopened rather than leaving subscribers on keepalives.
+        while True:
+            try:
+                self.listen()
+            except Exception:
+                self.app.logger.exception(
+                    'show listener failed; reconnecting in %ss',
+                    self.RETRY_AFTER)
+            time.sleep(self.RETRY_AFTER)
+
+    def listen(self):
+        with self.app.app_context():
+            raw = self.db.engine.raw_connection()
+            try:
+                conn = raw.connection
+                conn.autocommit = True
+                conn.cursor().execute('LISTEN {}'.format(CHANNEL))
+                while True:
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    notifies, conn.notifies[:] = list(conn.notifies), []
+                    if len(self.broker):
+                        for notify in notifies:
+                            self.publish(notify.payload)
+                    self.db.session.remove()
+            finally:
+                # A LISTENing connection must not go back to the pool.
+                raw.invalidate()
+
+    def publish(self, payload):
+        # One bad notification is logged and skipped.
+        try:
+            tiles = render_tiles([json.loads(payload)])
+        except Exception:
+            self.app.logger.exception('could not publish new show %s',
+                                      payload)
+            self.db.session.rollback()
+            return
+        for tile in tiles:
+            self.broker.publish(tile)
+
+
+def render_tiles(rows):
+    from models import ShowTile
+    format_datetime = current_app.jinja_env.filters['datetime']
+    artists = catalogue.lookup('artist',
+                               {int(row['artist_id']) for row in rows})
+    venues = catalogue.lookup('venue', {int(row['venue_id']) for row in rows})
+    tiles = []
+    for row in rows:
+        artist = artists.get(int(row['artist_id']))
+        venue = venues.get(int(row['venue_id']))
+        if artist is None or venue is None:
+            continue
+        start_time = row['start_time']
+        if isinstance(start_time, str):
+            start_time = dateutil.parser.parse(start_time)
+        show = ShowTile(row['venue_id'], venue.name, artist.id, artist.name,
+                        artist.image_link, format_datetime(str(start_time)))
+        tiles.append(render_template('pages/show_tile.html', show=show))
+    return tiles
+
+
+class ShowEvents(object):
+    def __init__(self):
+        self.broker = None
+        self.db = None
+        self.listener = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db):
+        app.config.setdefault('EVENTS_BACKEND', 'auto')
+        app.config.setdefault('EVENTS_KEEPALIVE', 15)
+        self.db = db
+        self.broker = Broker()
+        app.extensions['show_events'] = self
+
+    def uses_database(self):
+        backend = current_app.config['EVENTS_BACKEND']
+        if backend == 'auto':
+            return self.db.engine.dialect.name == 'postgresql'
+        return backend == 'postgresql'
+
+    def subscribe(self):
+        if self.uses_database():
+            with self._lock:
+                if self.listener is None or not self.listener.is_alive():
+                    self.listener = PostgresListener(
+                        current_app._get_current_object(), self.db,
+                        self.broker)
+                    self.listener.start()
+        return self.broker.subscribe()
+
+    def unsubscribe(self, q):
+        self.broker.unsubscribe(q)
+
+    def shows_created(self, rows):
+        # Called by views after commit; the database trigger covers this
+        # when listening on PostgreSQL.
+        if not rows or not len(self.broker) or self.uses_database():
+            return
+        for tile in render_tiles(rows):
+            self.broker.publish(tile)
+
+
+def sse(data, event=None):
+    lines = ['event: {}'.format(event)] if event else []
+    lines.extend('data: {}'.format(line) for line in data.splitlines())
+    return '\n'.join(lines) + '\n\n'
+
+
+def stream(events, q, keepalive):
+    # q must come from events.subscribe() inside the view: this generator
+    # runs after the request context is gone.
+    try:
+        # Tells the browser how long to wait before reconnecting.
+        yield 'retry: 3000\n\n'
+        while True:
+            try:
+                tile = q.get(timeout=keepalive)
+            except queue.Empty:
+                if not events.broker.is_subscribed(q):
+                    return
+                yield ': keepalive\n\n'
+                continue
+            yield sse(tile, event='show')
+    finally:
+        events.unsubscribe(q)
+
+
+show_events = ShowEvents()
@@ -1,11 +1,23 @@
+import uuid
 from datetime import datetime
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField
+from wtforms import (StringField, SelectField, SelectMultipleField,
+                     DateTimeField, TextAreaField, HiddenField)
 from wtforms.validators import DataRequired, AnyOf, URL, ValidationError
 import re
 
 
-class ShowForm(Form):
+class IdempotentForm(Form):
+    # Fresh per rendered form, so a resubmitted form is recognised as a retry.
+    idempotency_key = HiddenField('idempotency_key',
+                                  default=lambda: uuid.uuid4().hex)
+
+    def renew_idempotency_key(self):
+        # For forms re-rendered after a submit.
+        self.idempotency_key.data = uuid.uuid4().hex
+
+
+class ShowForm(IdempotentForm):
     artist_id = StringField('artist_id')
     venue_id = StringField('venue_id')
     start_time = DateTimeField('start_time',
@@ -13,7 +25,12 @@ class ShowForm(Form):
                                default=datetime.today())
 
 
-class VenueForm(Form):
+class ShowBatchForm(IdempotentForm):
+    # One show per line: artist_id, venue_id, YYYY-MM-DD HH:MM
+    shows = TextAreaField('shows', validators=[DataRequired()])
+
+
+class VenueForm(IdempotentForm):
     def validate_phone(self, phone):
         us_phone_num = '^([0-9]{3})[-][0-9]{3}[-][0-9]{4}$'
         match = re.search(us_phone_num, phone.data)
@@ -112,7 +129,7 @@ class VenueForm(Form):
     seeking_description = StringField('seeking_description')
 
 
-class ArtistForm(Form):
+class ArtistForm(IdempotentForm):
     def validate_phone(self, phone):
         us_phone_num = '^([0-9]{3})[-][0-9]{3}[-][0-9]{4}$'
         match = re.search(us_phone_num, phone.data)
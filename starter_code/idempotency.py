@@ -0,0 +1,130 @@
+import functools
+from datetime import datetime, timedelta
+from flask import current_app, g, make_response, request
+from sqlalchemy import exc
+
+from models import db, IdempotencyKey
+
+#----------------------------------------------------------------------------#
+# Idempotent writes.
+#----------------------------------------------------------------------------#
+
+HEADER = 'Idempotency-Key'
+FIELD = 'idempotency_key'
+
+
+def _expired(record):
+    ttl = timedelta(seconds=current_app.config['IDEMPOTENCY_TTL'])
+    return record.created_at < datetime.utcnow() - ttl
+
+
+def _abandoned(record):
+    # A claim with no response after IDEMPOTENCY_LEASE seconds belongs to a
+    # request that died between claiming the key and storing its response.
+    lease = timedelta(seconds=current_app.config['IDEMPOTENCY_LEASE'])
+    return (record.status_code is None
+            and record.created_at < datetime.utcnow() - lease)
+
+
+def _records(key):
+    # Keys are scoped by endpoint: the same key sent to another form is a
+    # different request.
+    return IdempotencyKey.query.filter_by(endpoint=request.endpoint, key=key)
+
+
+def _claim(key):
+    # Returns None when this request now owns the key, otherwise the
+    # existing record (finished, or still being processed by another
+    # request).
+    db.session.add(IdempotencyKey(key=key, endpoint=request.endpoint))
+    try:
+        db.session.commit()
+        return None
+    except exc.IntegrityError:
+        db.session.rollback()
+    record = _records(key).first()
+    if record is None or _expired(record) or _abandoned(record):
+        if record is not None:
+            # Only this row: another retry may have replaced it already.
+            _records(key).filter_by(created_at=record.created_at).delete()
+            db.session.commit()
+        return _claim(key)
+    return record
+
+
+def _replay(record):
+    if record.status_code is None:
+        return make_response(('This request is already being processed.',
+                              409))
+    response = make_response((record.body or b'', record.status_code))
+    if record.mimetype:
+        response.mimetype = record.mimetype
+    if record.location:
+        response.headers['Location'] = record.location
+    response.headers['Idempotent-Replay'] = 'true'
+    return response
+
+
+def release():
+    """Don't store this request's response: the view failed, and a retry
+    with the same key should run it again."""
+    g.idempotency_release = True
+
+
+def idempotent(view):
+    """Run a write view at most once per idempotency key.
+
+    The key comes from the Idempotency-Key header or the hidden
+    idempotency_key form field; requests without one run as usual.
+    """
+
+    @functools.wraps(view)
+    def wrapped(*args, **kwargs):
+        key = request.headers.get(HEADER) or request.form.get(FIELD)
+        if not key or len(key) > 64:
+            return view(*args, **kwargs)
+        record = _claim(key)
+        if record is not None:
+            return _replay(record)
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            _records(key).delete()
+            db.session.commit()
+            raise
+        # Only completed requests are stored; a 5xx, or a view that called
+        # release() (error pages are rendered with 200), frees the key so
+        # the client can retry for real.
+        if (response.status_code >= 500 or response.is_streamed
+                or g.pop('idempotency_release', False)):
+            _records(key).delete()
+        else:
+            _records(key).update({
+                'status_code': response.status_code,
+                'mimetype': response.mimetype,
+                'location': response.headers.get('Location'),
+                'body': response.get_data()
+            })
+        db.session.commit()
+        return response
+
+    return wrapped
+
+
+def purge_expired(ttl):
+    cutoff = datetime.utcnow() - timedelta(seconds=ttl)
+    deleted = IdempotencyKey.query.filter(
+        IdempotencyKey.created_at < cutoff).delete()
+    db.session.commit()
+    return deleted
+
+
+def init_app(app):
+    app.config.setdefault('IDEMPOTENCY_TTL', 24 * 60 * 60)
+    app.config.setdefault('IDEMPOTENCY_LEASE', 60)
+
+    @app.cli.command('purge-idempotency-keys')
+    def purge_idempotency_keys_command():
+        """Delete idempotency keys older than IDEMPOTENCY_TTL."""
+        print('{} expired keys deleted'.format(
+            purge_expired(app.config['IDEMPOTENCY_TTL'])))
@@ -0,0 +1,250 @@
+import functools
+import sqlite3
+import threading
+import time
+from flask import abort, current_app, jsonify, request
+from sqlalchemy import exc, text
+
+try:
+    import redis
+except ImportError:  # optional: only needed for redis:// storage
+    redis = None
+
+#----------------------------------------------------------------------------#
+# Token buckets.
+#----------------------------------------------------------------------------#
+
+# Each backend implements take(key, rate, capacity) -> seconds to wait, where
+# 0 means a token was taken. rate is tokens per second, capacity the burst.
+# A bucket that has refilled is the same as no bucket, so backends forget
+# buckets once they are full again (Redis by EXPIRE, the others by sweeping
+# at most every SWEEP_INTERVAL seconds).
+SWEEP_INTERVAL = 60
+
+
+def full_at(now, tokens, rate, capacity):
+    return now + (capacity - tokens) / rate
+
+
+class MemoryBackend(object):
+    """Per-process buckets; enough for a single worker."""
+
+    def __init__(self):
+        # key -> (tokens, stamp, time the bucket is full again)
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._swept = time.monotonic()
+
+    def take(self, key, rate, capacity):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._swept > SWEEP_INTERVAL:
+                self._buckets = {
+                    k: bucket
+                    for k, bucket in self._buckets.items() if bucket[2] > now
+                }
+                self._swept = now
+            tokens, stamp, _ = self._buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - stamp) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            self._buckets[key] = (tokens, now,
+                                  full_at(now, tokens, rate, capacity))
+            return wait
+
+
+class SQLiteBackend(object):
+    """Buckets in a SQLite file shared by every worker on one host. Also the
+    local stand-in for the Redis backend when testing multi-worker setups."""
+
+    def __init__(self, path):
+        self.path = path
+        self._swept = time.time()
+        # sqlite3's context manager only commits; close it too.
+        conn = self._connect()
+        try:
+            conn.execute('CREATE TABLE IF NOT EXISTS buckets '
+                         '(key TEXT PRIMARY KEY, tokens REAL, stamp REAL, '
+                         'full_at REAL)')
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def take(self, key, rate, capacity):
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT tokens, stamp FROM buckets WHERE key = ?',
+                               (key, )).fetchone()
+            tokens, stamp = row if row else (capacity, now)
+            tokens = min(capacity, tokens + (now - stamp) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            conn.execute('INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?)',
+                         (key, tokens, now,
+                          full_at(now, tokens, rate, capacity)))
+            if now - self._swept > SWEEP_INTERVAL:
+                conn.execute('DELETE FROM buckets WHERE full_at <= ?',
+                             (now, ))
+                self._swept = now
+            conn.execute('COMMIT')
+            return wait
+        finally:
+            conn.close()
+
+
+class RedisBackend(object):
+    """Buckets in Redis, updated atomically by a Lua script."""
+
+    SCRIPT = '''
+    local rate = tonumber(ARGV[1])
+    local capacity = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'stamp')
+    local tokens = tonumber(bucket[1]) or capacity
+    local stamp = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + (now - stamp) * rate)
+    local wait = 0
+    if tokens < 1 then
+        wait = (1 - tokens) / rate
+    else
+        tokens = tokens - 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'stamp', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return tostring(wait)
+    '''
+
+    def __init__(self, client):
+        self._take = client.register_script(self.SCRIPT)
+
+    def take(self, key, rate, capacity):
+        return float(self._take(keys=['ratelimit:' + key],
+                                args=[rate, capacity, time.time()]))
+
+
+def backend_from_uri(uri):
+    if uri.startswith('redis://'):
+        if redis is None:
+            raise RuntimeError('redis:// rate limit storage needs the redis '
+                               'package installed')
+        return RedisBackend(redis.Redis.from_url(uri))
+    if uri.startswith('sqlite:///'):
+        return SQLiteBackend(uri[len('sqlite:///'):])
+    return MemoryBackend()
+
+
+class RateLimiter(object):
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RATELIMIT_ENABLED', True)
+        app.config.setdefault('RATELIMIT_STORAGE_URI', 'memory://')
+        # scope -> (tokens per second, burst)
+        app.config.setdefault('RATELIMITS', {})
+        self.backend = backend_from_uri(app.config['RATELIMIT_STORAGE_URI'])
+        app.extensions['ratelimiter'] = self
+
+    @staticmethod
+    def client_ip():
+        # Behind proxies, ProxyFix (PROXY_FIX_X_FOR) has already set this
+        # from the trusted end of X-Forwarded-For.
+        return request.remote_addr or ''
+
+    def limit(self, scope):
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapped(*args, **kwargs):
+                config = current_app.config
+                rule = config['RATELIMITS'].get(scope)
+                if config['RATELIMIT_ENABLED'] and rule:
+                    key = '{}:{}:{}'.format(scope, request.endpoint,
+                                            self.client_ip())
+                    wait = self.backend.take(key, *rule)
+                    if wait:
+                        response = jsonify({
+                            'success': False,
+                            'message': 'Too many requests'
+                        })
+                        response.status_code = 429
+                        response.headers['Retry-After'] = str(
+                            int(wait) + 1)
+                        return response
+                return view(*args, **kwargs)
+
+            return wrapped
+
+        return decorator
+
+
+limiter = RateLimiter()
+
+#----------------------------------------------------------------------------#
+# Query-time budget.
+#----------------------------------------------------------------------------#
+
+
+# SQLSTATE query_canceled: PostgreSQL's statement_timeout (or a cancel).
+QUERY_CANCELED = '57014'
+
+
+def _cancelled(error):
+    # Only the budget's own interruption is a 503; a lost connection, a
+    # locked database or bad SQL is still an error.
+    orig = error.orig
+    if getattr(orig, 'pgcode', None) == QUERY_CANCELED:
+        return True
+    return isinstance(orig, sqlite3.OperationalError) and \
+        str(orig) == 'interrupted'
+
+
+def query_budget(db, config_key):
+    """Abort the view's SQL with a 503 once it has run longer than
+    app.config[config_key] milliseconds."""
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(*args, **kwargs):
+            budget = current_app.config.get(config_key)
+            if not budget:
+                return view(*args, **kwargs)
+            connection = db.session.connection()
+            dialect = connection.dialect.name
+            raw = None
+            exceeded = False
+            if dialect == 'postgresql':
+                # Scoped to this transaction; ends with commit/rollback.
+                connection.execute(
+                    text('SET LOCAL statement_timeout = {:d}'.format(
+                        int(budget))))
+            elif dialect == 'sqlite':
+                raw = connection.connection.connection
+                deadline = time.monotonic() + budget / 1000.0
+                raw.set_progress_handler(
+                    lambda: time.monotonic() > deadline, 1000)
+            try:
+                return view(*args, **kwargs)
+            except exc.OperationalError as e:
+                if not _cancelled(e):
+                    raise
+                exceeded = True
+            finally:
+                if raw is not None:
+                    raw.set_progress_handler(None, 0)
+            if exceeded:
+                db.session.rollback()
+                current_app.logger.warning('query budget exceeded on %s',
+                                           request.path)
+                abort(503)
+
+        return wrapped
+
+    return decorator
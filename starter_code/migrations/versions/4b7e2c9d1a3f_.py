@@ -0,0 +1,109 @@
+"""soft delete columns; partition Show by month on start_time
+
+Revision ID: 4b7e2c9d1a3f
+Revises: e0009e485581
+Create Date: 2026-10-19 10:12:41.118204
+
+"""
+from datetime import date
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b7e2c9d1a3f'
+down_revision = 'e0009e485581'
+branch_labels = None
+depends_on = None
+
+
+def _add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def upgrade():
+    op.add_column('Artist', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_Artist_deleted_at'), 'Artist', ['deleted_at'], unique=False)
+    op.add_column('Venue', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_Venue_deleted_at'), 'Venue', ['deleted_at'], unique=False)
+
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        op.add_column('Show', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+        op.create_index(op.f('ix_Show_deleted_at'), 'Show', ['deleted_at'], unique=False)
+        op.create_index('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'], unique=False)
+        op.create_index('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'], unique=False)
+        return
+
+    # A partitioned table's primary key must include the partition key.
+    op.execute('''
+        CREATE TABLE "Show_partitioned" (
+            id INTEGER NOT NULL,
+            start_time TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            artist_id INTEGER NOT NULL REFERENCES "Artist" (id),
+            venue_id INTEGER NOT NULL REFERENCES "Venue" (id),
+            deleted_at TIMESTAMP WITHOUT TIME ZONE,
+            PRIMARY KEY (id, start_time)
+        ) PARTITION BY RANGE (start_time)
+    ''')
+    op.execute('CREATE TABLE "Show_default" PARTITION OF "Show_partitioned" DEFAULT')
+
+    first = conn.execute(sa.text('SELECT min(start_time) FROM "Show"')).scalar()
+    day = date(first.year, first.month, 1) if first else date.today().replace(day=1)
+    end = _add_months(date.today(), 3)
+    while day <= end:
+        op.execute(
+            'CREATE TABLE "Show_y{:04d}m{:02d}" PARTITION OF "Show_partitioned" '
+            "FOR VALUES FROM ('{}') TO ('{}')".format(
+                day.year, day.month, day.isoformat(), _add_months(day, 1).isoformat()))
+        day = _add_months(day, 1)
+
+    op.execute('''
+        INSERT INTO "Show_partitioned" (id, start_time, artist_id, venue_id)
+        SELECT id, start_time, artist_id, venue_id FROM "Show"
+    ''')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY NONE')
+    op.drop_table('Show')
+    op.rename_table('Show_partitioned', 'Show')
+    op.execute('ALTER TABLE "Show" RENAME CONSTRAINT "Show_partitioned_pkey" TO "Show_pkey"')
+    op.execute('ALTER TABLE "Show" ALTER COLUMN id SET DEFAULT nextval(\'"Show_id_seq"\')')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+
+    op.create_index(op.f('ix_Show_deleted_at'), 'Show', ['deleted_at'], unique=False)
+    op.create_index('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'], unique=False)
+    op.create_index('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'], unique=False)
+
+
+def downgrade():
+    conn = op.get_bind()
+    op.drop_index('ix_Show_venue_id_start_time', table_name='Show')
+    op.drop_index('ix_Show_artist_id_start_time', table_name='Show')
+    op.drop_index(op.f('ix_Show_deleted_at'), table_name='Show')
+    if conn.dialect.name == 'postgresql':
+        # Archived partitions are not brought back; only attached ones are.
+        op.execute('''
+            CREATE TABLE "Show_plain" (
+                id INTEGER NOT NULL PRIMARY KEY,
+                start_time TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+                artist_id INTEGER NOT NULL REFERENCES "Artist" (id),
+                venue_id INTEGER NOT NULL REFERENCES "Venue" (id)
+            )
+        ''')
+        op.execute('''
+            INSERT INTO "Show_plain" (id, start_time, artist_id, venue_id)
+            SELECT id, start_time, artist_id, venue_id FROM "Show"
+        ''')
+        op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY NONE')
+        op.drop_table('Show')
+        op.rename_table('Show_plain', 'Show')
+        op.execute('ALTER TABLE "Show" RENAME CONSTRAINT "Show_plain_pkey" TO "Show_pkey"')
+        op.execute('ALTER TABLE "Show" ALTER COLUMN id SET DEFAULT nextval(\'"Show_id_seq"\')')
+        op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+    else:
+        op.drop_column('Show', 'deleted_at')
+
+    op.drop_index(op.f('ix_Venue_deleted_at'), table_name='Venue')
+    op.drop_column('Venue', 'deleted_at')
+    op.drop_index(op.f('ix_Artist_deleted_at'), table_name='Artist')
+    op.drop_column('Artist', 'deleted_at')
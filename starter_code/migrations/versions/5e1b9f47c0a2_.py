@@ -0,0 +1,28 @@
+"""keyset pagination indexes for /artists; (start_time, artist_id) on Show
+
+Revision ID: 5e1b9f47c0a2
+Revises: d81f4a6c3e29
+Create Date: 2026-10-19 21:12:40.118734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e1b9f47c0a2'
+down_revision = 'd81f4a6c3e29'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Artist_name_id', 'Artist', ['name', 'id'], unique=False)
+    op.create_index('ix_Artist_state_city_name_id', 'Artist', ['state', 'city', 'name', 'id'], unique=False)
+    op.create_index('ix_Show_start_time_artist_id', 'Show', ['start_time', 'artist_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Show_start_time_artist_id', table_name='Show')
+    op.drop_index('ix_Artist_state_city_name_id', table_name='Artist')
+    op.drop_index('ix_Artist_name_id', table_name='Artist')
@@ -0,0 +1,44 @@
+"""idempotency keys; unique (artist_id, venue_id, start_time) on Show
+
+Revision ID: 9c2d5e8f7a41
+Revises: 4b7e2c9d1a3f
+Create Date: 2026-10-19 14:36:02.519380
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c2d5e8f7a41'
+down_revision = '4b7e2c9d1a3f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('IdempotencyKey',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('endpoint', sa.String(length=120), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('status_code', sa.Integer(), nullable=True),
+    sa.Column('mimetype', sa.String(length=120), nullable=True),
+    sa.Column('location', sa.String(length=500), nullable=True),
+    sa.Column('body', sa.LargeBinary(), nullable=True),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index(op.f('ix_IdempotencyKey_created_at'), 'IdempotencyKey', ['created_at'], unique=False)
+
+    # Drop rows that earlier retries duplicated before enforcing uniqueness.
+    op.execute('''
+        DELETE FROM "Show" WHERE id NOT IN (
+            SELECT min(id) FROM "Show" GROUP BY artist_id, venue_id, start_time
+        )
+    ''')
+    op.create_index('uq_Show_artist_id_venue_id_start_time', 'Show', ['artist_id', 'venue_id', 'start_time'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_Show_artist_id_venue_id_start_time', table_name='Show')
+    op.drop_index(op.f('ix_IdempotencyKey_created_at'), table_name='IdempotencyKey')
+    op.drop_table('IdempotencyKey')
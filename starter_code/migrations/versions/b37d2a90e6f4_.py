@@ -0,0 +1,40 @@
+"""transactional outbox and relay offsets
+
+Revision ID: b37d2a90e6f4
+Revises: 5e1b9f47c0a2
+Create Date: 2026-10-19 22:03:18.640215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b37d2a90e6f4'
+down_revision = '5e1b9f47c0a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('Outbox',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('entity', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('operation', sa.String(length=10), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('OutboxOffset',
+    sa.Column('consumer', sa.String(length=120), nullable=False),
+    sa.Column('position', sa.BigInteger(), nullable=False),
+    sa.Column('skipped', sa.Text(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('consumer')
+    )
+
+
+def downgrade():
+    op.drop_table('OutboxOffset')
+    op.drop_table('Outbox')
@@ -0,0 +1,33 @@
+"""scope idempotency keys by endpoint
+
+Revision ID: c4a81e7d5f92
+Revises: b37d2a90e6f4
+Create Date: 2026-10-19 23:41:07.112834
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a81e7d5f92'
+down_revision = 'b37d2a90e6f4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('IdempotencyKey') as batch_op:
+        batch_op.drop_constraint('IdempotencyKey_pkey', type_='primary')
+        batch_op.create_primary_key('IdempotencyKey_pkey', ['endpoint', 'key'])
+
+
+def downgrade():
+    # The same key may now be stored once per endpoint; keep the newest.
+    op.execute('''
+        DELETE FROM "IdempotencyKey" k USING "IdempotencyKey" newer
+        WHERE newer.key = k.key AND newer.created_at > k.created_at
+    ''')
+    with op.batch_alter_table('IdempotencyKey') as batch_op:
+        batch_op.drop_constraint('IdempotencyKey_pkey', type_='primary')
+        batch_op.create_primary_key('IdempotencyKey_pkey', ['key'])
@@ -0,0 +1,45 @@
+"""notify new_show on Show insert
+
+Revision ID: d81f4a6c3e29
+Revises: 9c2d5e8f7a41
+Create Date: 2026-10-19 16:05:47.301962
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81f4a6c3e29'
+down_revision = '9c2d5e8f7a41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('''
+        CREATE OR REPLACE FUNCTION notify_new_show() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('new_show', json_build_object(
+                'id', NEW.id,
+                'artist_id', NEW.artist_id,
+                'venue_id', NEW.venue_id,
+                'start_time', NEW.start_time
+            )::text);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    op.execute('''
+        CREATE TRIGGER show_notify_insert AFTER INSERT ON "Show"
+        FOR EACH ROW EXECUTE PROCEDURE notify_new_show()
+    ''')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('DROP TRIGGER IF EXISTS show_notify_insert ON "Show"')
+    op.execute('DROP FUNCTION IF EXISTS notify_new_show()')
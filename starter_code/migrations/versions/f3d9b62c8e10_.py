@@ -0,0 +1,34 @@
+"""stored upcoming show count per artist
+
+Revision ID: f3d9b62c8e10
+Revises: c4a81e7d5f92
+Create Date: 2026-10-20 00:12:45.380211
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3d9b62c8e10'
+down_revision = 'c4a81e7d5f92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Artist', sa.Column('upcoming_shows', sa.Integer(), server_default='0', nullable=False))
+    op.execute('''
+        UPDATE "Artist" SET upcoming_shows = (
+            SELECT count(*) FROM "Show"
+            WHERE "Show".artist_id = "Artist".id
+              AND "Show".start_time > localtimestamp
+              AND "Show".deleted_at IS NULL
+        )
+    ''')
+    op.create_index('ix_Artist_upcoming_shows_id', 'Artist', ['upcoming_shows', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Artist_upcoming_shows_id', table_name='Artist')
+    op.drop_column('Artist', 'upcoming_shows')
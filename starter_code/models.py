@@ -1,18 +1,47 @@
+from collections import namedtuple
 from datetime import datetime, timezone
-from flask_sqlalchemy import SQLAlchemy
+from routing import RoutingSQLAlchemy
 
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
 
-class Venue(db.Model):
+class SoftDeleteMixin(object):
+    deleted_at = db.Column(db.DateTime, nullable=True, index=True)
+
+    @classmethod
+    def active(cls):
+        return cls.query.filter(cls.deleted_at.is_(None))
+
+
+# Plain tuples for list pages: only the columns the templates use, and
+# nothing added to the session's identity map.
+ListItem = namedtuple('ListItem', ['id', 'name'])
+VenueListItem = namedtuple('VenueListItem', ['id', 'name', 'city', 'state'])
+ArtistListItem = namedtuple(
+    'ArtistListItem', ['id', 'name', 'city', 'state', 'upcoming_shows'])
+ShowTile = namedtuple('ShowTile', [
+    'venue_id', 'venue_name', 'artist_id', 'artist_name', 'artist_image_link',
+    'start_time'
+])
+
+
+class ListableMixin(object):
+    @classmethod
+    def list_items(cls, *criterion):
+        query = db.session.query(cls.id, cls.name).filter(
+            cls.deleted_at.is_(None), *criterion).order_by(cls.id)
+        return [ListItem._make(row) for row in query]
+
+
+class Venue(SoftDeleteMixin, ListableMixin, db.Model):
     __tablename__ = 'Venue'
 
     id = db.Column(db.Integer, primary_key=True)
@@ -31,6 +60,16 @@ class Venue(db.Model):
     def __repr__(self):
         return f'<Venue {self.id} {self.name}>'
 
+    def soft_delete(self):
+        # Returns the ids of the shows hidden along with it.
+        now = datetime.utcnow()
+        self.deleted_at = now
+        shows = Show.query.filter(Show.venue_id == self.id,
+                                  Show.deleted_at.is_(None))
+        show_ids = [id for id, in shows.with_entities(Show.id)]
+        shows.update({'deleted_at': now}, synchronize_session=False)
+        return show_ids
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -48,8 +87,16 @@ class Venue(db.Model):
         }
 
 
-class Artist(db.Model):
+class Artist(SoftDeleteMixin, ListableMixin, db.Model):
     __tablename__ = 'Artist'
+    # Keyset pagination on /artists: name order, optionally within a city,
+    # or most upcoming shows first.
+    __table_args__ = (
+        db.Index('ix_Artist_name_id', 'name', 'id'),
+        db.Index('ix_Artist_state_city_name_id', 'state', 'city', 'name',
+                 'id'),
+        db.Index('ix_Artist_upcoming_shows_id', 'upcoming_shows', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -62,11 +109,44 @@ class Artist(db.Model):
     website = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(120))
+    # Count of active shows still to come, kept for sort=upcoming. Show
+    # writes recount their artists; shows that start only leave the count
+    # when `flask refresh-upcoming-shows` runs.
+    upcoming_shows = db.Column(db.Integer,
+                               nullable=False,
+                               default=0,
+                               server_default='0')
     shows = db.relationship('Show', backref='artist', lazy=True, uselist=False)
 
     def __repr__(self):
         return f'<Artist {self.id} {self.name}>'
 
+    @classmethod
+    def refresh_upcoming_shows(cls, ids=None):
+        """Recount upcoming_shows, in the session's transaction, for the
+        artists in ids (a list or a query of ids) or for every artist.
+        Returns the number of artists whose count changed."""
+        count = db.select([db.func.count()]).where(
+            db.and_(Show.artist_id == cls.id,
+                    Show.start_time > datetime.now(),
+                    Show.deleted_at.is_(None))).as_scalar()
+        # Only rewrite rows whose count changed.
+        update = cls.__table__.update().where(
+            cls.upcoming_shows != count).values(upcoming_shows=count)
+        if ids is not None:
+            update = update.where(cls.id.in_(ids))
+        return db.session.execute(update).rowcount
+
+    def soft_delete(self):
+        # Returns the ids of the shows hidden along with it.
+        now = datetime.utcnow()
+        self.deleted_at = now
+        shows = Show.query.filter(Show.artist_id == self.id,
+                                  Show.deleted_at.is_(None))
+        show_ids = [id for id, in shows.with_entities(Show.id)]
+        shows.update({'deleted_at': now}, synchronize_session=False)
+        return show_ids
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -83,8 +163,22 @@ class Artist(db.Model):
         }
 
 
-class Show(db.Model):
+class Show(SoftDeleteMixin, db.Model):
+    # In PostgreSQL this table is range-partitioned by month on start_time
+    # (see migrations), with primary key (id, start_time). The ORM only needs
+    # id to identify a row.
     __tablename__ = 'Show'
+    __table_args__ = (
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        # Upcoming show counts per artist read only future shows.
+        db.Index('ix_Show_start_time_artist_id', 'start_time', 'artist_id'),
+        db.Index('uq_Show_artist_id_venue_id_start_time',
+                 'artist_id',
+                 'venue_id',
+                 'start_time',
+                 unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     start_time = db.Column(db.DateTime,
@@ -130,3 +224,55 @@ class Show(db.Model):
             'venue_image_link': self.Venue.image_link,
             'start_time': self.start_time
         }
+
+
+class IdempotencyKey(db.Model):
+    # One row per submitted write and endpoint; a retry with the same key
+    # replays the stored response instead of writing again. Rows expire
+    # after IDEMPOTENCY_TTL seconds, or IDEMPOTENCY_LEASE seconds if no
+    # response was ever stored.
+    __tablename__ = 'IdempotencyKey'
+    # Bookkeeping: claiming a key doesn't pin the client to the primary.
+    pins_writer = False
+
+    endpoint = db.Column(db.String(120), primary_key=True)
+    key = db.Column(db.String(64), primary_key=True)
+    created_at = db.Column(db.DateTime,
+                           nullable=False,
+                           default=datetime.utcnow,
+                           index=True)
+    status_code = db.Column(db.Integer)
+    mimetype = db.Column(db.String(120))
+    location = db.Column(db.String(500))
+    body = db.Column(db.LargeBinary)
+
+
+class OutboxEvent(db.Model):
+    # Change log for downstream consumers: written in the same transaction as
+    # the change it describes and relayed in id order by `flask relay-outbox`.
+    __tablename__ = 'Outbox'
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'),
+                   primary_key=True)
+    created_at = db.Column(db.DateTime,
+                           nullable=False,
+                           default=datetime.utcnow)
+    entity = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    operation = db.Column(db.String(10), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+
+
+class OutboxOffset(db.Model):
+    # Last Outbox id each relay consumer has delivered.
+    __tablename__ = 'OutboxOffset'
+
+    consumer = db.Column(db.String(120), primary_key=True)
+    position = db.Column(db.BigInteger, nullable=False, default=0)
+    # JSON {id: unix time}: ids below position the relay moved past while
+    # they were still uncommitted.
+    skipped = db.Column(db.Text, nullable=False, default='{}')
+    updated_at = db.Column(db.DateTime,
+                           nullable=False,
+                           default=datetime.utcnow,
+                           onupdate=datetime.utcnow)
@@ -0,0 +1,181 @@
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+import click
+
+from models import db, OutboxEvent, OutboxOffset
+
+#----------------------------------------------------------------------------#
+# Change-data-capture outbox.
+#----------------------------------------------------------------------------#
+
+# Write views call record() before their commit, so an Outbox row exists if
+# and only if the change it describes was committed. `flask relay-outbox`
+# then streams rows past a consumer's stored offset as NDJSON, one line per
+# change:
+#
+#   {"offset": 42, "at": "...", "entity": "venue", "id": 7,
+#    "op": "update", "data": {...}}
+#
+# and moves the offset after each batch is written, so delivery is
+# at-least-once: consumers should upsert by (entity, id).
+#
+# A gap in ids is a transaction that hasn't committed yet (or rolled back).
+# The relay waits OUTBOX_GAP_TIMEOUT for it, then moves on but keeps the
+# missing ids with the offset and re-checks them on every batch for
+# OUTBOX_SKIPPED_TTL, so a slow transaction is delivered late (below the
+# offset already written) rather than lost.
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(repr(value))
+
+
+def row_data(instance):
+    return {
+        column.key: getattr(instance, column.key)
+        for column in instance.__table__.columns
+    }
+
+
+def record(entity, entity_id, operation, data):
+    db.session.add(
+        OutboxEvent(entity=entity,
+                    entity_id=entity_id,
+                    operation=operation,
+                    payload=json.dumps(data,
+                                       default=_json_default,
+                                       sort_keys=True)))
+
+
+def record_row(instance, operation):
+    """Append the current state of a Venue, Artist or Show. New rows are
+    flushed first so they have an id."""
+    if instance.id is None:
+        db.session.flush()
+    record(instance.__tablename__.lower(), instance.id, operation,
+           row_data(instance))
+
+
+def record_soft_delete(instance, show_ids):
+    """Append deletes for a soft-deleted venue/artist and the shows hidden
+    with it."""
+    record_row(instance, 'delete')
+    for show_id in show_ids:
+        record('show', show_id, 'delete', {
+            'id': show_id,
+            'deleted_at': instance.deleted_at
+        })
+
+
+def ready(events, position, gap_timeout, skipped):
+    # Ids are handed out before commit, so a lower id can still commit after
+    # a higher one is visible. Stop at a gap until it is older than
+    # gap_timeout, then skip it, adding its ids to skipped.
+    cutoff = datetime.utcnow() - timedelta(seconds=gap_timeout)
+    expected = position + 1
+    for event in events:
+        if event.id != expected:
+            if event.created_at > cutoff:
+                return
+            skipped.update(range(expected, event.id))
+        yield event
+        expected = event.id + 1
+
+
+def late_events(skipped, skipped_ttl):
+    """Return skipped events that have committed since, and forget them
+    and any skipped longer than skipped_ttl ago (rolled back)."""
+    cutoff = time.time() - skipped_ttl
+    for id, at in list(skipped.items()):
+        if at < cutoff:
+            del skipped[id]
+    if not skipped:
+        return []
+    events = OutboxEvent.query.filter(OutboxEvent.id.in_(
+        list(skipped))).order_by(OutboxEvent.id).all()
+    for event in events:
+        del skipped[event.id]
+    return events
+
+
+def relay_batch(consumer, batch_size, gap_timeout, skipped_ttl, out):
+    """Write the next batch for consumer to out and advance its offset.
+    Returns the number of new (not late) events written."""
+    # Locked so two relays for one consumer can't deliver the same batch.
+    offset = OutboxOffset.query.filter_by(
+        consumer=consumer).with_for_update().first()
+    if offset is None:
+        offset = OutboxOffset(consumer=consumer, position=0, skipped='{}')
+        db.session.add(offset)
+    skipped = {int(id): at for id, at in json.loads(offset.skipped).items()}
+    late = late_events(skipped, skipped_ttl)
+    events = OutboxEvent.query.filter(
+        OutboxEvent.id > offset.position).order_by(
+            OutboxEvent.id).limit(batch_size).all()
+    gaps = set()
+    batch = list(ready(events, offset.position, gap_timeout, gaps))
+    now = time.time()
+    skipped.update((id, now) for id in gaps)
+    for event in late + batch:
+        out.write(
+            json.dumps(
+                {
+                    'offset': event.id,
+                    'at': event.created_at.isoformat(),
+                    'entity': event.entity,
+                    'id': event.entity_id,
+                    'op': event.operation,
+                    'data': json.loads(event.payload),
+                },
+                sort_keys=True) + '\n')
+    # On disk before the offset moves past it (pipes can't be synced).
+    out.flush()
+    try:
+        os.fsync(out.fileno())
+    except OSError:
+        pass
+    if batch:
+        offset.position = batch[-1].id
+    offset.skipped = json.dumps(skipped, sort_keys=True)
+    db.session.commit()
+    return len(batch)
+
+
+def init_app(app):
+    app.config.setdefault('OUTBOX_BATCH_SIZE', 500)
+    app.config.setdefault('OUTBOX_GAP_TIMEOUT', 30)
+    app.config.setdefault('OUTBOX_SKIPPED_TTL', 60 * 60)
+
+    @app.cli.command('relay-outbox')
+    @click.option('--consumer', required=True,
+                  help='Name the offset is stored under.')
+    @click.option('--output', type=click.Path(dir_okay=False), default='-',
+                  help='File to append NDJSON to (default: stdout).')
+    @click.option('--batch-size', type=int, default=None)
+    @click.option('--follow', is_flag=True,
+                  help='Keep polling for new changes.')
+    @click.option('--interval', type=float, default=1.0,
+                  help='Seconds between polls with --follow.')
+    def relay_outbox_command(consumer, output, batch_size, follow, interval):
+        """Stream outbox changes past the consumer's offset as NDJSON."""
+        batch_size = batch_size or app.config['OUTBOX_BATCH_SIZE']
+        out = sys.stdout if output == '-' else open(output, 'a')
+        try:
+            while True:
+                written = relay_batch(consumer, batch_size,
+                                      app.config['OUTBOX_GAP_TIMEOUT'],
+                                      app.config['OUTBOX_SKIPPED_TTL'], out)
+                if written == batch_size:
+                    continue
+                if not follow:
+                    break
+                db.session.remove()
+                time.sleep(interval)
+        finally:
+            if out is not sys.stdout:
+                out.close()
@@ -0,0 +1,31 @@
+import base64
+import json
+
+#----------------------------------------------------------------------------#
+# Keyset cursors.
+#----------------------------------------------------------------------------#
+
+# A cursor is the sort key of the last row on a page, plus the sort order it
+# belongs to, as URL-safe base64 JSON. The next page starts strictly after
+# that key, so it costs the same however deep it is and doesn't shift when
+# rows are added to earlier pages.
+
+
+def encode_cursor(sort, key):
+    raw = json.dumps([sort, list(key)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip(
+        '=')
+
+
+def decode_cursor(cursor, sort):
+    """Return the key list stored in cursor. Raises ValueError."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, key = json.loads(raw.decode('utf-8'))
+    except (ValueError, TypeError):
+        raise ValueError('invalid cursor')
+    if not isinstance(key, list):
+        raise ValueError('invalid cursor')
+    if cursor_sort != sort:
+        raise ValueError('cursor belongs to another sort order')
+    return key
@@ -0,0 +1,152 @@
+from datetime import date, datetime
+import click
+from sqlalchemy import text
+
+#----------------------------------------------------------------------------#
+# Show partitions (PostgreSQL).
+#----------------------------------------------------------------------------#
+
+# "Show" is range-partitioned by month on start_time. Each month lives in
+# "Show_yYYYYmMM"; anything without a partition lands in "Show_default".
+# Keep partitions created ahead of time so the default one stays empty, and
+# write views call ensure_for() before inserting further out. PostgreSQL
+# refuses to add a partition whose range has rows in the default, so
+# create_partition() moves any such rows into the new partition first.
+ARCHIVE_SCHEMA = 'archive'
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(day):
+    return 'Show_y{:04d}m{:02d}'.format(day.year, day.month)
+
+
+def partition_exists(conn, day):
+    return conn.execute(text('SELECT to_regclass(:name)'),
+                        name='"{}"'.format(partition_name(day))).scalar() \
+        is not None
+
+
+def create_partition(conn, day):
+    start = date(day.year, day.month, 1)
+    end = add_months(start, 1)
+    name = partition_name(start)
+    if partition_exists(conn, start):
+        return
+    bounds = "FOR VALUES FROM ('{}') TO ('{}')".format(start.isoformat(),
+                                                       end.isoformat())
+    stranded = conn.execute(
+        text('SELECT EXISTS (SELECT 1 FROM "Show_default" '
+             'WHERE start_time >= :start AND start_time < :end)'),
+        start=start, end=end).scalar()
+    if not stranded:
+        conn.execute(
+            text('CREATE TABLE "{}" PARTITION OF "Show" {}'.format(name, bounds)))
+        return
+    # Build the partition beside "Show", move the month's rows out of the
+    # default one, then attach it (indexes and keys are added on attach).
+    conn.execute(
+        text('CREATE TABLE "{}" (LIKE "Show" INCLUDING DEFAULTS)'.format(name)))
+    conn.execute(
+        text('WITH moved AS (DELETE FROM "Show_default" '
+             'WHERE start_time >= :start AND start_time < :end RETURNING *) '
+             'INSERT INTO "{}" SELECT * FROM moved'.format(name)),
+        start=start, end=end)
+    conn.execute(
+        text('ALTER TABLE "Show" ATTACH PARTITION "{}" {}'.format(name, bounds)))
+
+
+def ensure_for(engine, times):
+    """Create the partitions for shows starting at times, so new rows don't
+    land in the default partition. Call it once the rows are validated, just
+    before inserting them, and outside any transaction of the request's
+    session that has read "Show": creating a partition locks the table
+    exclusively."""
+    if engine.dialect.name != 'postgresql':
+        return
+    months = sorted({date(t.year, t.month, 1) for t in times})
+    with engine.begin() as conn:
+        missing = [day for day in months if not partition_exists(conn, day)]
+        if not missing:
+            return
+        # One creator at a time; create_partition re-checks under the lock.
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('Show'))"))
+        for day in missing:
+            create_partition(conn, day)
+
+
+def ensure_partitions(conn, start, months_ahead):
+    day = date(start.year, start.month, 1)
+    end = add_months(date.today(), months_ahead)
+    created = []
+    while day <= end:
+        create_partition(conn, day)
+        created.append(partition_name(day))
+        day = add_months(day, 1)
+    return created
+
+
+def monthly_partitions(conn):
+    rows = conn.execute(
+        text("SELECT c.relname FROM pg_inherits i "
+             "JOIN pg_class c ON c.oid = i.inhrelid "
+             "JOIN pg_class p ON p.oid = i.inhparent "
+             "WHERE p.relname = 'Show' AND c.relname LIKE 'Show\\_y%' "
+             "ORDER BY c.relname"))
+    return [row[0] for row in rows]
+
+
+def archive_partitions(conn, before, drop=False):
+    # Detach every monthly partition that ends on or before `before`; the
+    # detached table is moved to the archive schema, or dropped.
+    cutoff = partition_name(date(before.year, before.month, 1))
+    archived = []
+    for name in monthly_partitions(conn):
+        if name >= cutoff:
+            continue
+        conn.execute(text('ALTER TABLE "Show" DETACH PARTITION "{}"'.format(name)))
+        if drop:
+            conn.execute(text('DROP TABLE "{}"'.format(name)))
+        else:
+            conn.execute(
+                text('CREATE SCHEMA IF NOT EXISTS {}'.format(ARCHIVE_SCHEMA)))
+            conn.execute(
+                text('ALTER TABLE "{}" SET SCHEMA {}'.format(
+                    name, ARCHIVE_SCHEMA)))
+        archived.append(name)
+    return archived
+
+
+def init_app(app, db):
+    app.config.setdefault('SHOW_PARTITIONS_AHEAD', 3)
+    app.config.setdefault('SHOW_ARCHIVE_AFTER_MONTHS', 12)
+
+    @app.cli.command('create-show-partitions')
+    @click.option('--ahead', type=int, default=None,
+                  help='Months past the current one to create.')
+    def create_show_partitions_command(ahead):
+        """Create monthly Show partitions up to N months ahead."""
+        if ahead is None:
+            ahead = app.config['SHOW_PARTITIONS_AHEAD']
+        with db.engine.begin() as conn:
+            for name in ensure_partitions(conn, date.today(), ahead):
+                print(name)
+
+    @app.cli.command('archive-shows')
+    @click.option('--before', default=None,
+                  help='YYYY-MM; partitions for earlier months are archived.')
+    @click.option('--drop', is_flag=True,
+                  help='Drop detached partitions instead of keeping them.')
+    def archive_shows_command(before, drop):
+        """Detach old Show partitions into the archive schema."""
+        if before:
+            cutoff = datetime.strptime(before, '%Y-%m').date()
+        else:
+            cutoff = add_months(date.today(),
+                                -app.config['SHOW_ARCHIVE_AFTER_MONTHS'])
+        with db.engine.begin() as conn:
+            for name in archive_partitions(conn, cutoff, drop):
+                print('{} {}'.format('dropped' if drop else 'archived', name))
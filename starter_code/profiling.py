@@ -0,0 +1,221 @@
+import functools
+import hmac
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from flask import request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Per-request profiling.
+#----------------------------------------------------------------------------#
+
+# Off unless PROFILE_ENABLED is set; then a request is profiled when it sends
+# the PROFILE_HEADER with PROFILE_TOKEN as its value or is picked by
+# PROFILE_SAMPLE_RATE; without a token the header is ignored. A profiled request gets a Server-Timing
+# header and writes two files to PROFILE_DIR:
+#   <stamp>-<endpoint>.folded  stack samples, for flamegraph.pl / speedscope
+#   <stamp>-<endpoint>.json    span totals (db, view, template, ...)
+# With profiling disabled nothing is hooked; when enabled, a request that is
+# not profiled costs one thread-local lookup per hook.
+
+_local = threading.local()
+
+
+class Trace(object):
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = defaultdict(float)
+        self.counts = Counter()
+        self.sampler = None
+
+    def add(self, name, elapsed):
+        self.spans[name] += elapsed
+        self.counts[name] += 1
+
+
+def current_trace():
+    return getattr(_local, 'trace', None)
+
+
+class span(object):
+    """Time a block as a named span of the current trace, if any."""
+
+    def __init__(self, name):
+        self.name = name
+        self.trace = None
+
+    def __enter__(self):
+        self.trace = current_trace()
+        if self.trace is not None:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.trace is not None:
+            self.trace.add(self.name, time.perf_counter() - self.start)
+
+
+def traced(name):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapped(*args, **kwargs):
+            if current_trace() is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapped
+
+    return decorator
+
+
+class TracedTemplate(Template):
+    def render(self, *args, **kwargs):
+        with span('template'):
+            return Template.render(self, *args, **kwargs)
+
+
+class Sampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval."""
+
+    def __init__(self, thread_id, interval):
+        threading.Thread.__init__(self, name='fyyur-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('{}:{}:{}'.format(
+                    os.path.basename(code.co_filename), code.co_name,
+                    frame.f_lineno))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    if current_trace() is not None:
+        conn.info.setdefault('profile_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    trace = current_trace()
+    starts = conn.info.get('profile_start')
+    if trace is not None and starts:
+        trace.add('db', time.perf_counter() - starts.pop())
+
+
+def _wants_profile(config):
+    header = request.headers.get(config['PROFILE_HEADER'])
+    if header is not None:
+        # Profiling is costly: never let an anonymous header trigger it.
+        token = config['PROFILE_TOKEN']
+        return bool(token) and hmac.compare_digest(header.encode(),
+                                                   token.encode())
+    rate = config['PROFILE_SAMPLE_RATE']
+    return rate > 0 and random.random() < rate
+
+
+_sequence = itertools.count()
+
+
+def _write(directory, trace, total):
+    os.makedirs(directory, exist_ok=True)
+    # pid and a per-process counter keep concurrent requests (threads or
+    # workers) in the same second from overwriting each other's files.
+    stem = os.path.join(
+        directory, '{}-{}-{}-{}'.format(time.strftime('%Y%m%dT%H%M%S'),
+                                        request.endpoint or 'unknown',
+                                        os.getpid(), next(_sequence)))
+    if trace.sampler is not None:
+        with open(stem + '.folded', 'w') as f:
+            for stack, count in sorted(trace.sampler.stacks.items()):
+                f.write('{} {}\n'.format(stack, count))
+    with open(stem + '.json', 'w') as f:
+        json.dump(
+            {
+                'method': request.method,
+                'path': request.full_path,
+                'endpoint': request.endpoint,
+                'total_ms': total * 1000,
+                'spans_ms': {k: v * 1000
+                             for k, v in trace.spans.items()},
+                'counts': dict(trace.counts),
+            },
+            f,
+            indent=2,
+            sort_keys=True)
+
+
+def init_app(app):
+    app.config.setdefault('PROFILE_ENABLED', False)
+    app.config.setdefault('PROFILE_HEADER', 'X-Profile')
+    app.config.setdefault('PROFILE_TOKEN', None)
+    app.config.setdefault('PROFILE_SAMPLE_RATE', 0.0)
+    app.config.setdefault('PROFILE_INTERVAL', 0.001)
+    app.config.setdefault('PROFILE_DIR',
+                          os.path.join(app.root_path, 'profiles'))
+    if not app.config['PROFILE_ENABLED']:
+        return
+
+    if not event.contains(Engine, 'before_cursor_execute',
+                          _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    # Must be set before any template is loaded (and so before warm-up).
+    app.jinja_env.template_class = TracedTemplate
+    # Inclusive of the db, template and filter spans that run inside it.
+    app.dispatch_request = traced('view')(app.dispatch_request)
+
+    @app.before_request
+    def start_profile():
+        _local.trace = None
+        if not _wants_profile(app.config):
+            return
+        trace = Trace()
+        trace.sampler = Sampler(threading.get_ident(),
+                                app.config['PROFILE_INTERVAL'])
+        trace.sampler.start()
+        _local.trace = trace
+
+    @app.after_request
+    def finish_profile(response):
+        trace = current_trace()
+        if trace is None:
+            return response
+        _local.trace = None
+        trace.sampler.stop()
+        total = time.perf_counter() - trace.started
+        _write(app.config['PROFILE_DIR'], trace, total)
+        timings = ['{};dur={:.2f}'.format(name, elapsed * 1000)
+                   for name, elapsed in sorted(trace.spans.items())]
+        timings.append('total;dur={:.2f}'.format(total * 1000))
+        response.headers['Server-Timing'] = ', '.join(timings)
+        return response
+
+    @app.teardown_request
+    def drop_profile(error):
+        trace = current_trace()
+        if trace is not None:
+            _local.trace = None
+            trace.sampler.stop()
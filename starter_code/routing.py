@@ -0,0 +1,146 @@
+import itertools
+import threading
+import time
+import sqlalchemy
+from sqlalchemy import exc, orm
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+
+#----------------------------------------------------------------------------#
+# Read-replica routing.
+#----------------------------------------------------------------------------#
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_COOKIE = 'fyyur_primary_until'
+
+
+class ReplicaSet(object):
+    """Round-robin over replica engines, skipping ones that failed a health
+    check until `retry_after` seconds have passed."""
+
+    def __init__(self, uris, check_interval=5.0, retry_after=30.0):
+        self.engines = [
+            sqlalchemy.create_engine(uri, pool_pre_ping=True) for uri in uris
+        ]
+        self.check_interval = check_interval
+        self.retry_after = retry_after
+        self._checked = {}  # engine index -> (timestamp, healthy)
+        self._cycle = itertools.cycle(range(len(self.engines)))
+        self._lock = threading.Lock()
+
+    def healthy(self, index):
+        now = time.monotonic()
+        checked_at, ok = self._checked.get(index, (None, True))
+        interval = self.check_interval if ok else self.retry_after
+        if checked_at is not None and now - checked_at < interval:
+            return ok
+        try:
+            with self.engines[index].connect() as conn:
+                conn.execute(sqlalchemy.text('SELECT 1'))
+            ok = True
+        except exc.SQLAlchemyError:
+            ok = False
+        self._checked[index] = (now, ok)
+        return ok
+
+    def mark_down(self, engine):
+        index = self.engines.index(engine)
+        self._checked[index] = (time.monotonic(), False)
+
+    def choose(self):
+        # None means no replica is usable and the caller should use the
+        # primary.
+        for _ in range(len(self.engines)):
+            with self._lock:
+                index = next(self._cycle)
+            if self.healthy(index):
+                return self.engines[index]
+        return None
+
+
+def _replica_for_request():
+    if not has_request_context() or not getattr(g, 'use_replica', False):
+        return None
+    if 'replica_engine' not in g:
+        # One replica per request so a page sees a single snapshot.
+        g.replica_engine = current_app.extensions['replicas'].choose()
+    return g.replica_engine
+
+
+class RoutingSession(SignallingSession):
+    def get_bind(self, mapper=None, clause=None):
+        if not self._flushing:
+            engine = _replica_for_request()
+            if engine is not None:
+                return engine
+        return SignallingSession.get_bind(self, mapper, clause)
+
+
+# A request that commits changes pins its client to the primary; reads, failed
+# writes that rolled back and rate-limited requests don't.
+@sqlalchemy.event.listens_for(RoutingSession, 'after_flush')
+def _note_changes(session, flush_context):
+    # Models can opt out with pins_writer = False.
+    if any(
+            getattr(instance, 'pins_writer', True) for instance in
+            itertools.chain(session.new, session.dirty, session.deleted)):
+        session.info['changed'] = True
+
+
+@sqlalchemy.event.listens_for(RoutingSession, 'after_commit')
+def _note_commit(session):
+    if session.info.pop('changed', False) and has_request_context():
+        g.wrote = True
+
+
+@sqlalchemy.event.listens_for(RoutingSession, 'after_rollback')
+def _forget_changes(session):
+    session.info.pop('changed', None)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """SQLAlchemy that sends read-only requests to SQLALCHEMY_REPLICA_URIS.
+
+    A client that just wrote is pinned to the primary for
+    SQLALCHEMY_REPLICA_PIN_SECONDS so it reads its own writes.
+    """
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def init_app(self, app):
+        SQLAlchemy.init_app(self, app)
+        app.config.setdefault('SQLALCHEMY_REPLICA_URIS', [])
+        app.config.setdefault('SQLALCHEMY_REPLICA_PIN_SECONDS', 5)
+        app.config.setdefault('SQLALCHEMY_REPLICA_CHECK_INTERVAL', 5)
+        app.config.setdefault('SQLALCHEMY_REPLICA_RETRY_AFTER', 30)
+        uris = app.config['SQLALCHEMY_REPLICA_URIS']
+        if not uris:
+            return
+        app.extensions['replicas'] = ReplicaSet(
+            uris, app.config['SQLALCHEMY_REPLICA_CHECK_INTERVAL'],
+            app.config['SQLALCHEMY_REPLICA_RETRY_AFTER'])
+
+        @app.before_request
+        def route_reads():
+            try:
+                pinned = float(request.cookies.get(PIN_COOKIE, 0)) > time.time()
+            except ValueError:
+                pinned = False
+            g.use_replica = request.method in SAFE_METHODS and not pinned
+
+        @app.after_request
+        def pin_writers(response):
+            if g.get('wrote'):
+                pin = app.config['SQLALCHEMY_REPLICA_PIN_SECONDS']
+                response.set_cookie(PIN_COOKIE,
+                                    '{:.3f}'.format(time.time() + pin),
+                                    max_age=pin,
+                                    httponly=True)
+            return response
+
+        @app.teardown_request
+        def drop_failed_replica(error):
+            engine = g.get('replica_engine')
+            if engine is not None and isinstance(error, exc.OperationalError):
+                app.extensions['replicas'].mark_down(engine)
@@ -2,3 +2,32 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Delete buttons on detail pages: <button data-delete-url="/venues/1">
+document.addEventListener('click', function (e) {
+  var url = e.target.getAttribute && e.target.getAttribute('data-delete-url');
+  if (!url || !window.confirm('Delete this listing?')) {
+    return;
+  }
+  var xhr = new XMLHttpRequest();
+  xhr.open('DELETE', url);
+  xhr.onload = function () {
+    if (xhr.status === 200) {
+      window.location = '/';
+    }
+  };
+  xhr.send();
+});
+
+// Live listing on /shows: prepend tiles pushed by /shows/stream. Runs after
+// parsing because this file is loaded from <head>.
+document.addEventListener('DOMContentLoaded', function () {
+  var list = document.querySelector('[data-stream-url]');
+  if (!list || !window.EventSource) {
+    return;
+  }
+  var source = new EventSource(list.getAttribute('data-stream-url'));
+  source.addEventListener('show', function (e) {
+    list.insertAdjacentHTML('afterbegin', e.data);
+  });
+});
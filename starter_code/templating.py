@@ -0,0 +1,27 @@
+import os
+from jinja2 import FileSystemBytecodeCache
+
+#----------------------------------------------------------------------------#
+# Jinja setup.
+#----------------------------------------------------------------------------#
+
+
+def configure_jinja(app):
+    # Must run before app.jinja_env is first touched: Flask builds the
+    # environment lazily from jinja_options.
+    cache_dir = app.config.get('TEMPLATE_CACHE_DIR')
+    if not cache_dir:
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    app.jinja_options = dict(app.jinja_options,
+                             bytecode_cache=FileSystemBytecodeCache(cache_dir))
+
+
+def warm_templates(app):
+    # Compile every page up front so the first request a worker serves
+    # doesn't pay for parsing templates.
+    env = app.jinja_env
+    names = env.list_templates(filter_func=lambda name: name.endswith('.html'))
+    for name in names:
+        env.get_template(name)
+    return names
@@ -0,0 +1,64 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# app.py builds its app at import time from config.py, which reads the
+# environment, so point it at scratch storage before anything imports it.
+SCRATCH = tempfile.mkdtemp(prefix='fyyur-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(SCRATCH, 'fyyur.db')
+os.environ.pop('DATABASE_REPLICA_URLS', None)
+os.environ['TEMPLATE_WARMUP'] = '0'
+os.environ['TEMPLATE_CACHE_DIR'] = os.path.join(SCRATCH, 'jinja')
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app
+    app.config.update(TESTING=True,
+                      RATELIMIT_ENABLED=False,
+                      CATALOGUE_PATH=os.path.join(SCRATCH, 'catalogue.bin'),
+                      CATALOGUE_CHECK_INTERVAL=0)
+    return app
+
+
+@pytest.fixture
+def db(app):
+    """An empty schema, inside an app context."""
+    from models import db
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield db
+        db.session.remove()
+    if os.path.exists(app.config['CATALOGUE_PATH']):
+        os.remove(app.config['CATALOGUE_PATH'])
+
+
+@pytest.fixture
+def client(app, db):
+    return app.test_client()
+
+
+@pytest.fixture
+def artist(db):
+    from models import Artist
+    artist = Artist(name='The Hop Band', city='San Francisco', state='CA',
+                    phone='555-555-5555', genres='Jazz')
+    db.session.add(artist)
+    db.session.commit()
+    return artist.id
+
+
+@pytest.fixture
+def venue(db):
+    from models import Venue
+    venue = Venue(name='The Musical Hop', city='San Francisco', state='CA',
+                  address='1015 Folsom Street', phone='555-555-5555')
+    db.session.add(venue)
+    db.session.commit()
+    return venue.id
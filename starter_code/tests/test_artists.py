@@ -0,0 +1,69 @@
+"""Keyset pages of the /artists listing."""
+from datetime import datetime
+
+from app import artist_page
+from models import Artist, Show
+
+
+def add_artists(db, names):
+    artists = [Artist(name=name, city='Austin', state='TX', genres='Jazz')
+               for name in names]
+    db.session.add_all(artists)
+    db.session.commit()
+    return [artist.id for artist in artists]
+
+
+def walk(sort, page_size=2):
+    seen, args = [], {'sort': sort}
+    while True:
+        items, cursor = artist_page(args, page_size)
+        seen += items
+        if cursor is None:
+            return seen
+        args = {'sort': sort, 'after': cursor}
+
+
+def test_name_pages_include_artists_without_a_name(db):
+    ids = add_artists(db, ['b', None, 'a', None, 'c'])
+    assert [item.id for item in walk('name')] == [
+        ids[2], ids[0], ids[4], ids[1], ids[3]
+    ]
+
+
+def test_upcoming_sort_reads_the_stored_count(db, client, venue):
+    ids = add_artists(db, ['a', 'b', 'c'])
+    for start_time in ('2035-04-01 20:00', '2035-04-02 20:00'):
+        client.post('/shows/create', data={
+            'artist_id': ids[1],
+            'venue_id': venue,
+            'start_time': start_time
+        })
+    client.post('/shows/create', data={
+        'artist_id': ids[2],
+        'venue_id': venue,
+        'start_time': '2035-04-03 20:00'
+    })
+    items = walk('upcoming')
+    assert [(item.id, item.upcoming_shows) for item in items] == [
+        (ids[1], 2), (ids[2], 1), (ids[0], 0)
+    ]
+
+
+def test_deleting_a_venue_recounts_its_artists(client, artist, venue):
+    client.post('/shows/create', data={
+        'artist_id': artist,
+        'venue_id': venue,
+        'start_time': '2035-04-01 20:00'
+    })
+    assert Artist.query.get(artist).upcoming_shows == 1
+    client.delete('/venues/{}'.format(venue))
+    assert Artist.query.get(artist).upcoming_shows == 0
+
+
+def test_refresh_drops_shows_that_have_started(db, artist, venue):
+    db.session.add(Show(artist_id=artist, venue_id=venue,
+                        start_time=datetime(2001, 1, 1, 20)))
+    Artist.query.get(artist).upcoming_shows = 1
+    db.session.commit()
+    assert Artist.refresh_upcoming_shows() == 1
+    assert Artist.query.get(artist).upcoming_shows == 0
@@ -0,0 +1,48 @@
+"""Static bundles and how they are served."""
+import os
+import shutil
+
+import pytest
+
+from assets import DIST_DIR, IMMUTABLE, build_bundles
+
+
+@pytest.fixture
+def built(app):
+    dist = os.path.join(app.static_folder, DIST_DIR)
+    existed = os.path.isdir(dist)
+    manifest = build_bundles(app.static_folder)
+    yield manifest
+    if not existed:
+        shutil.rmtree(dist)
+
+
+def get(client, filename, encoding):
+    return client.get('/static/{}/{}'.format(DIST_DIR, filename),
+                      headers={'Accept-Encoding': encoding})
+
+
+def test_bundles_keep_the_original_script_order(client):
+    html = client.get('/').get_data(as_text=True)
+    order = ['modernizr', 'moment.min', 'jquery-1.11.1', 'script.js',
+             'bootstrap-3.1.1', 'plugins.js']
+    positions = [html.index(name) for name in order]
+    assert positions == sorted(positions)
+    assert '<script type="text/javascript" src="/static/js/libs/' \
+        'jquery-1.11.1.min.js"></script>' in html
+    assert 'src="/static/js/script.js" defer' in html
+
+
+def test_bundles_are_served_per_accept_encoding(client, built):
+    response = get(client, built['main.js'], 'gzip, deflate')
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Cache-Control'] == IMMUTABLE
+    for refused in ('gzip;q=0', 'identity', 'br;q=0, gzip;q=0'):
+        response = get(client, built['main.js'], refused)
+        assert 'Content-Encoding' not in response.headers
+
+
+def test_manifest_is_revalidated(client, built):
+    response = get(client, 'manifest.json', 'gzip')
+    assert 'immutable' not in response.headers['Cache-Control']
+    assert response.headers['Cache-Control'] == 'no-cache'
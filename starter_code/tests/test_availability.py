@@ -0,0 +1,30 @@
+"""Free/busy windows for artists and venues."""
+import pytest
+
+
+def test_busy_slot_from_a_listed_show(client, artist, venue):
+    client.post('/shows/create', data={
+        'artist_id': artist,
+        'venue_id': venue,
+        'start_time': '2035-04-01 20:00'
+    })
+    response = client.get('/venues/{}/availability'.format(venue),
+                          query_string={'start': '2035-04-01',
+                                        'end': '2035-04-02'})
+    assert response.status_code == 200
+    assert len(response.get_json()['busy']) == 1
+
+
+@pytest.mark.parametrize('query', [
+    {'start': '0001-01-01'},
+    {'start': '9999-12-31'},
+    {'start': '9999-12-01', 'end': '9999-12-31'},
+    {'start': '2035-04-01', 'end': '9999-12-31T23:59'},
+    {'start': 'soon'},
+    {'start': '2035-04-02', 'end': '2035-04-01'},
+])
+def test_bad_windows_are_a_400(client, venue, query):
+    response = client.get('/venues/{}/availability'.format(venue),
+                          query_string=query)
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
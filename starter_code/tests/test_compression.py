@@ -0,0 +1,21 @@
+"""Response compression."""
+from compression import CompressedCache
+
+
+def test_cache_evicts_least_recently_used():
+    cache = CompressedCache(2)
+    cache.set('a', b'1')
+    cache.set('b', b'2')
+    assert cache.get('a') == b'1'
+    cache.set('c', b'3')
+    assert cache.get('b') is None
+    assert cache.get('a') == b'1' and cache.get('c') == b'3'
+
+
+def test_gzip_only_when_accepted(client, venue):
+    response = client.get('/venues/{}'.format(venue),
+                          headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    response = client.get('/venues/{}'.format(venue),
+                          headers={'Accept-Encoding': 'gzip;q=0'})
+    assert 'Content-Encoding' not in response.headers
@@ -0,0 +1,71 @@
+"""Edge caching through the local stub proxy (benchmarks/edge_proxy.py)."""
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from urllib.request import Request, urlopen
+
+import pytest
+from werkzeug.serving import make_server
+
+from benchmarks.edge_proxy import EdgeCache, make_handler
+
+
+@pytest.fixture
+def edge(app, db, monkeypatch):
+    origin = make_server('127.0.0.1', 0, app, threaded=True)
+    cache = EdgeCache('Surrogate-Key')
+    proxy = ThreadingHTTPServer(
+        ('127.0.0.1', 0),
+        make_handler('http://127.0.0.1:{}'.format(origin.server_port),
+                     cache))
+    for server in (origin, proxy):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = 'http://127.0.0.1:{}'.format(proxy.server_port)
+    monkeypatch.setitem(app.config, 'SURROGATE_PURGE_URL', base + '/purge')
+    yield base, cache
+    proxy.shutdown()
+    origin.shutdown()
+
+
+def fetch(url, method='GET', encoding='identity'):
+    request = Request(url, method=method,
+                      headers={'Accept-Encoding': encoding})
+    with urlopen(request) as response:
+        return response.headers['X-Cache'], response.headers
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_second_request_is_a_hit(edge, venue):
+    base, _ = edge
+    url = '{}/venues/{}'.format(base, venue)
+    state, headers = fetch(url)
+    assert state == 'MISS'
+    assert 'venue-{}'.format(venue) in headers['Surrogate-Key'].split()
+    assert fetch(url)[0] == 'HIT'
+
+
+def test_each_encoding_is_cached_separately(edge, venue):
+    base, cache = edge
+    url = '{}/venues/{}'.format(base, venue)
+    assert fetch(url)[0] == 'MISS'
+    assert fetch(url, encoding='gzip')[0] == 'MISS'
+    assert fetch(url, encoding='gzip, deflate')[0] == 'HIT'
+    assert len(cache.entries) == 2
+
+
+def test_deleting_an_artist_purges_venue_availability(edge, artist, venue):
+    base, cache = edge
+    url = '{}/venues/{}/availability'.format(base, venue)
+    state, headers = fetch(url)
+    assert state == 'MISS'
+    assert 'shows' in headers['Surrogate-Key'].split()
+    assert fetch(url)[0] == 'HIT'
+    fetch('{}/artists/{}'.format(base, artist), method='DELETE')
+    wait_for(lambda: not cache.entries)
+    assert fetch(url)[0] == 'MISS'
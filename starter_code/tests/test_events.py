@@ -0,0 +1,51 @@
+"""New-show events: the in-process fallback used off PostgreSQL."""
+from events import Broker, show_events, sse, stream
+
+
+def test_listing_a_show_publishes_its_tile(app, client, artist, venue):
+    with app.test_request_context():
+        q = show_events.subscribe()
+    try:
+        response = client.post('/shows/create', data={
+            'artist_id': artist,
+            'venue_id': venue,
+            'start_time': '2035-04-01 20:00'
+        })
+        assert b'successfully listed' in response.data
+        tile = q.get(timeout=1)
+        assert 'The Hop Band' in tile and 'The Musical Hop' in tile
+    finally:
+        show_events.unsubscribe(q)
+
+
+def test_nothing_is_rendered_without_subscribers(app, client, artist, venue,
+                                                 monkeypatch):
+    monkeypatch.setattr('events.render_tiles', lambda rows: 1 / 0)
+    response = client.post('/shows/create', data={
+        'artist_id': artist,
+        'venue_id': venue,
+        'start_time': '2035-04-01 20:00'
+    })
+    assert b'successfully listed' in response.data
+
+
+def test_stream_sends_events_and_ends_when_dropped(app):
+    with app.test_request_context():
+        q = show_events.subscribe()
+    q.put('<li>tile</li>')
+    chunks = stream(show_events, q, keepalive=0.01)
+    assert next(chunks) == 'retry: 3000\n\n'
+    assert next(chunks) == sse('<li>tile</li>', event='show')
+    assert next(chunks) == ': keepalive\n\n'
+    show_events.unsubscribe(q)
+    assert list(chunks) == []
+
+
+def test_slow_subscribers_are_dropped():
+    broker = Broker(queue_size=1)
+    q = broker.subscribe()
+    broker.publish('one')
+    broker.publish('two')
+    assert not broker.is_subscribed(q)
+    assert q.get_nowait() == 'one'
+    assert q.empty()
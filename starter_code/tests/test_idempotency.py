@@ -0,0 +1,51 @@
+"""Idempotency keys on write forms."""
+from datetime import datetime, timedelta
+
+from models import Artist, IdempotencyKey, Show
+
+
+def list_show(client, artist, venue, key):
+    return client.post('/shows/create', data={
+        'artist_id': artist,
+        'venue_id': venue,
+        'start_time': '2035-04-01 20:00'
+    }, headers={'Idempotency-Key': key})
+
+
+def test_retry_replays_the_stored_response(client, artist, venue):
+    first = list_show(client, artist, venue, 'k1')
+    again = list_show(client, artist, venue, 'k1')
+    assert b'successfully listed' in again.data
+    assert again.headers['Idempotent-Replay'] == 'true'
+    assert again.data == first.data
+    assert Show.query.count() == 1
+
+
+def test_keys_are_scoped_by_endpoint(client, artist, venue):
+    list_show(client, artist, venue, 'k1')
+    response = client.post('/artists/create', data={
+        'name': 'Guns N Petals', 'city': 'San Francisco', 'state': 'CA',
+        'phone': '326-123-5000', 'genres': ['Rock n Roll']
+    }, headers={'Idempotency-Key': 'k1'})
+    assert 'Idempotent-Replay' not in response.headers
+    assert Artist.query.filter_by(name='Guns N Petals').count() == 1
+
+
+def test_in_flight_claim_conflicts_until_its_lease_ends(app, db, client,
+                                                        artist, venue):
+    db.session.add(
+        IdempotencyKey(key='k1', endpoint='main.create_show_submission'))
+    db.session.commit()
+    # Each request gets its own session in production; here they share the
+    # test's, so drop what it has loaded before every request.
+    db.session.remove()
+    assert list_show(client, artist, venue, 'k1').status_code == 409
+
+    lease = app.config['IDEMPOTENCY_LEASE']
+    IdempotencyKey.query.filter_by(key='k1').update(
+        {'created_at': datetime.utcnow() - timedelta(seconds=lease + 1)})
+    db.session.commit()
+    db.session.remove()
+    response = list_show(client, artist, venue, 'k1')
+    assert b'successfully listed' in response.data
+    assert Show.query.count() == 1
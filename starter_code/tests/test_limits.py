@@ -0,0 +1,38 @@
+"""Rate limits and the search query budget."""
+import pytest
+from sqlalchemy import exc, text
+from werkzeug.exceptions import ServiceUnavailable
+
+from limits import query_budget
+
+SLOW = text('WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL '
+            'SELECT i + 1 FROM n WHERE i < 100000000) SELECT count(*) FROM n')
+
+
+@pytest.fixture
+def budgeted(app, db, monkeypatch):
+    monkeypatch.setitem(app.config, 'TEST_BUDGET_MS', 50)
+
+    def run(statement):
+        @query_budget(db, 'TEST_BUDGET_MS')
+        def view():
+            return db.session.execute(statement).scalar()
+
+        with app.test_request_context('/'):
+            return view()
+
+    return run
+
+
+def test_query_over_budget_is_a_503(budgeted):
+    with pytest.raises(ServiceUnavailable):
+        budgeted(SLOW)
+
+
+def test_other_database_errors_are_not_hidden(budgeted):
+    with pytest.raises(exc.OperationalError, match='no such table'):
+        budgeted(text('SELECT * FROM missing'))
+
+
+def test_query_within_budget_runs(budgeted):
+    assert budgeted(text('SELECT 1')) == 1
@@ -0,0 +1,152 @@
+"""Show partitions and migration 4b7e2c9d1a3f.
+
+The PostgreSQL tests need TEST_POSTGRES_URL pointing at a scratch database
+(its public and archive schemas are dropped) and psycopg2; they are skipped
+otherwise.
+"""
+import os
+from datetime import date, datetime
+
+import pytest
+from flask import Flask
+from sqlalchemy import text
+
+import partitions
+from partitions import add_months, partition_name
+
+POSTGRES_URL = os.environ.get('TEST_POSTGRES_URL')
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'migrations')
+
+
+def test_month_arithmetic():
+    assert add_months(date(2035, 11, 20), 1) == date(2035, 12, 1)
+    assert add_months(date(2035, 12, 1), 1) == date(2036, 1, 1)
+    assert add_months(date(2035, 1, 1), -1) == date(2034, 12, 1)
+    assert partition_name(date(2035, 4, 9)) == 'Show_y2035m04'
+
+
+def test_ensure_for_is_a_no_op_off_postgresql(app, db):
+    partitions.ensure_for(db.engine, [datetime(2035, 4, 1)])
+
+
+def test_partitions_are_created_only_for_valid_batches(client, artist, venue,
+                                                      monkeypatch):
+    calls = []
+    monkeypatch.setattr(partitions, 'ensure_for',
+                        lambda engine, times: calls.append(list(times)))
+    row = {'artist_id': artist, 'venue_id': venue,
+           'start_time': '2035-04-01T20:00'}
+    response = client.post('/shows/batch', json={
+        'shows': [row, dict(row, venue_id=99)]
+    })
+    assert response.status_code == 400
+    assert calls == []
+    response = client.post('/shows/batch', json={'shows': [row]})
+    assert response.status_code == 201
+    assert calls == [[datetime(2035, 4, 1, 20)]]
+
+
+@pytest.fixture
+def postgres():
+    if not POSTGRES_URL:
+        pytest.skip('TEST_POSTGRES_URL is not set')
+    pytest.importorskip('psycopg2')
+    from flask_migrate import Migrate
+    from models import db
+    pg_app = Flask(__name__)
+    pg_app.config.update(SQLALCHEMY_DATABASE_URI=POSTGRES_URL,
+                         SQLALCHEMY_TRACK_MODIFICATIONS=False)
+    db.init_app(pg_app)
+    Migrate(pg_app, db, directory=MIGRATIONS)
+    with pg_app.app_context():
+        reset(db.engine)
+        yield db
+        db.session.remove()
+        reset(db.engine)
+
+
+def reset(engine):
+    with engine.begin() as conn:
+        conn.execute(text('DROP SCHEMA IF EXISTS {} CASCADE'.format(
+            partitions.ARCHIVE_SCHEMA)))
+        conn.execute(text('DROP SCHEMA public CASCADE'))
+        conn.execute(text('CREATE SCHEMA public'))
+
+
+def partitions_of(conn):
+    return set(partitions.monthly_partitions(conn))
+
+
+def test_migration_partitions_existing_shows(postgres):
+    from flask_migrate import downgrade, upgrade
+    upgrade(MIGRATIONS, 'e0009e485581')
+    with postgres.engine.begin() as conn:
+        conn.execute(text(
+            'INSERT INTO "Artist" (id, name) VALUES (1, \'a\');'
+            'INSERT INTO "Venue" (id, name) VALUES (1, \'v\');'
+            'INSERT INTO "Show" (start_time, artist_id, venue_id) VALUES '
+            "('2020-01-15 20:00', 1, 1), ('2020-03-15 20:00', 1, 1)"))
+
+    upgrade(MIGRATIONS, '4b7e2c9d1a3f')
+    with postgres.engine.begin() as conn:
+        assert conn.execute(text(
+            "SELECT count(*) FROM pg_partitioned_table p "
+            "JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = 'Show'")).scalar() == 1
+        assert {'Show_y2020m01', 'Show_y2020m02',
+                'Show_y2020m03'} <= partitions_of(conn)
+        assert conn.execute(text(
+            'SELECT count(*) FROM "Show"')).scalar() == 2
+        assert conn.execute(text(
+            'SELECT count(*) FROM "Show_default"')).scalar() == 0
+        # New rows still get ids from the old sequence.
+        new_id = conn.execute(text(
+            'INSERT INTO "Show" (start_time, artist_id, venue_id) '
+            "VALUES ('2020-02-01 20:00', 1, 1) RETURNING id")).scalar()
+        assert new_id == 3
+
+    upgrade(MIGRATIONS, 'head')
+    downgrade(MIGRATIONS, 'e0009e485581')
+    with postgres.engine.begin() as conn:
+        assert conn.execute(text(
+            "SELECT count(*) FROM pg_partitioned_table")).scalar() == 0
+        assert conn.execute(text(
+            'SELECT count(*) FROM "Show"')).scalar() == 3
+
+
+def test_ensure_for_creates_and_moves_stranded_rows(postgres):
+    from flask_migrate import upgrade
+    upgrade(MIGRATIONS, 'head')
+    engine = postgres.engine
+    with engine.begin() as conn:
+        conn.execute(text(
+            'INSERT INTO "Artist" (id, name) VALUES (1, \'a\');'
+            'INSERT INTO "Venue" (id, name) VALUES (1, \'v\');'
+            'INSERT INTO "Show" (start_time, artist_id, venue_id) VALUES '
+            "('2040-05-15 20:00', 1, 1)"))
+        assert conn.execute(text(
+            'SELECT count(*) FROM "Show_default"')).scalar() == 1
+
+    partitions.ensure_for(engine, [datetime(2040, 5, 20), datetime(2040, 6, 1)])
+    partitions.ensure_for(engine, [datetime(2040, 5, 20)])
+    with engine.begin() as conn:
+        assert {'Show_y2040m05', 'Show_y2040m06'} <= partitions_of(conn)
+        assert conn.execute(text(
+            'SELECT count(*) FROM "Show_default"')).scalar() == 0
+        assert conn.execute(text(
+            'SELECT count(*) FROM "Show_y2040m05"')).scalar() == 1
+
+
+def test_archive_detaches_old_months(postgres):
+    from flask_migrate import upgrade
+    upgrade(MIGRATIONS, 'head')
+    engine = postgres.engine
+    partitions.ensure_for(engine, [datetime(2001, 1, 1), datetime(2001, 2, 1)])
+    with engine.begin() as conn:
+        archived = partitions.archive_partitions(conn, date(2001, 2, 1))
+        assert archived == ['Show_y2001m01']
+        assert 'Show_y2001m01' not in partitions_of(conn)
+        assert conn.execute(text(
+            "SELECT to_regclass('{}.\"Show_y2001m01\"')".format(
+                partitions.ARCHIVE_SCHEMA))).scalar() is not None
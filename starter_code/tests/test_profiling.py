@@ -0,0 +1,20 @@
+"""Which requests get profiled."""
+from profiling import _wants_profile
+
+CONFIG = {'PROFILE_HEADER': 'X-Profile', 'PROFILE_SAMPLE_RATE': 0}
+
+
+def wants(app, headers, token):
+    with app.test_request_context(headers=headers):
+        return _wants_profile(dict(CONFIG, PROFILE_TOKEN=token))
+
+
+def test_header_needs_the_configured_token(app):
+    assert wants(app, {'X-Profile': 's3cret'}, 's3cret')
+    assert not wants(app, {'X-Profile': 'guess'}, 's3cret')
+    assert not wants(app, {}, 's3cret')
+
+
+def test_header_is_ignored_without_a_token(app):
+    assert not wants(app, {'X-Profile': '1'}, None)
+    assert not wants(app, {'X-Profile': ''}, '')
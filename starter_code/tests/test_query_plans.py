@@ -0,0 +1,25 @@
+"""Query budgets and plans for the hot pages (see benchmarks/query_plans.py)."""
+import pytest
+
+from benchmarks.query_plans import ROUTES, busiest_ids, check_route
+
+
+@pytest.fixture(scope='module')
+def seeded(app):
+    from models import db
+    from benchmarks.seed import seed
+    with app.app_context():
+        seed(db, artists=200, venues=50, shows=5000)
+        ids = busiest_ids(db)
+        db.session.remove()
+        yield db.engine, ids
+
+
+@pytest.mark.parametrize('template,budget', ROUTES,
+                         ids=[template for template, _ in ROUTES])
+def test_route_within_budget_and_indexed(app, seeded, template, budget):
+    engine, ids = seeded
+    with app.app_context():
+        _, problems = check_route(app.test_client(), engine,
+                                  template.format(**ids), budget)
+    assert problems == []
@@ -0,0 +1,110 @@
+"""Read-replica routing, with two SQLite files standing in for the primary and
+a lagging replica."""
+import time
+
+import pytest
+import sqlalchemy
+from flask import Flask, request
+from sqlalchemy.exc import IntegrityError
+
+from routing import PIN_COOKIE, RoutingSQLAlchemy
+
+
+@pytest.fixture
+def routed(tmp_path):
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI='sqlite:///' + str(tmp_path / 'primary.db'),
+        SQLALCHEMY_REPLICA_URIS=['sqlite:///' + str(tmp_path / 'replica.db')],
+        SQLALCHEMY_TRACK_MODIFICATIONS=False)
+    db = RoutingSQLAlchemy()
+
+    class Note(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        text = db.Column(db.String(20), unique=True)
+
+    class Receipt(db.Model):
+        pins_writer = False
+        id = db.Column(db.Integer, primary_key=True)
+
+    db.init_app(app)
+
+    @app.route('/notes')
+    def notes():
+        return ','.join(note.text for note in Note.query.order_by(Note.id))
+
+    @app.route('/notes', methods=['POST'])
+    def add_note():
+        db.session.add(Note(text=request.form['text']))
+        if request.form.get('preview'):
+            # Flushed, then abandoned; only bookkeeping is committed, the
+            # way a failed idempotent write releases its key.
+            db.session.flush()
+            db.session.rollback()
+            db.session.add(Receipt())
+            db.session.commit()
+            return 'previewed'
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return 'already there', 409
+        return 'added'
+
+    @app.route('/receipts', methods=['POST'])
+    def add_receipt():
+        db.session.add(Receipt())
+        db.session.commit()
+        return 'noted'
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(Note(text='primary'))
+        db.session.commit()
+    # The replica has the schema but lags behind: different rows.
+    replica = sqlalchemy.create_engine(app.config['SQLALCHEMY_REPLICA_URIS'][0])
+    db.metadata.create_all(replica)
+    replica.execute(Note.__table__.insert(), text='replica')
+    replica.dispose()
+    return app
+
+
+def pinned(response):
+    return any(cookie.startswith(PIN_COOKIE + '=')
+               for cookie in response.headers.getlist('Set-Cookie'))
+
+
+def test_reads_go_to_the_replica(routed):
+    assert routed.test_client().get('/notes').data == b'replica'
+
+
+def test_committed_write_pins_the_client_to_the_primary(routed):
+    client = routed.test_client()
+    response = client.post('/notes', data={'text': 'new'})
+    assert response.data == b'added' and pinned(response)
+    assert client.get('/notes').data == b'primary,new'
+    # Other clients still read the replica.
+    assert routed.test_client().get('/notes').data == b'replica'
+
+
+def test_rolled_back_write_does_not_pin(routed):
+    client = routed.test_client()
+    response = client.post('/notes', data={'text': 'new', 'preview': '1'})
+    assert response.data == b'previewed' and not pinned(response)
+    response = client.post('/notes', data={'text': 'primary'})
+    assert response.status_code == 409 and not pinned(response)
+    assert client.get('/notes').data == b'replica'
+
+
+def test_bookkeeping_writes_do_not_pin(routed):
+    client = routed.test_client()
+    response = client.post('/receipts')
+    assert response.data == b'noted' and not pinned(response)
+
+
+def test_expired_pin_reads_the_replica_again(routed):
+    client = routed.test_client()
+    client.set_cookie('localhost', PIN_COOKIE, str(time.time() - 1))
+    assert client.get('/notes').data == b'replica'
+    client.set_cookie('localhost', PIN_COOKIE, str(time.time() + 60))
+    assert client.get('/notes').data == b'primary'
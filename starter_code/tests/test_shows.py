@@ -0,0 +1,33 @@
+"""Listing shows and editing the rows they point at."""
+from models import Show
+
+
+def create_show(client, artist_id, venue_id, start_time='2035-04-01 20:00'):
+    return client.post('/shows/create', data={
+        'artist_id': artist_id,
+        'venue_id': venue_id,
+        'start_time': start_time
+    })
+
+
+def test_show_is_listed_once(client, artist, venue):
+    assert b'successfully listed' in create_show(client, artist, venue).data
+    assert b'already listed' in create_show(client, artist, venue).data
+    assert Show.query.count() == 1
+
+
+def test_unknown_artist_or_venue_is_refused(client, artist, venue):
+    assert b'unknown artist' in create_show(client, 99, venue).data
+    assert b'unknown venue' in create_show(client, artist, 99).data
+    assert Show.query.count() == 0
+
+
+def test_deleted_artist_is_refused(client, artist, venue):
+    client.delete('/artists/{}'.format(artist))
+    assert b'unknown artist' in create_show(client, artist, venue).data
+    assert Show.query.count() == 0
+
+
+def test_editing_a_missing_row_is_a_404(client):
+    assert client.post('/artists/99/edit', data={}).status_code == 404
+    assert client.post('/venues/99/edit', data={'name': 'x'}).status_code == 404
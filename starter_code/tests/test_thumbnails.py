@@ -0,0 +1,110 @@
+"""Thumbnail fetching against a local HTTP stand-in for image hosts."""
+import base64
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from thumbnails import ThumbnailError, download, thumbnail_stem, thumbnails
+
+# A 1x1 PNG.
+PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQ'
+    'GAhKmMIQAAAABJRU5ErkJggg==')
+
+
+class ImageHost(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/redirect':
+            self.send_response(302)
+            self.send_header('Location', '/image.png')
+            self.end_headers()
+        elif self.path == '/image.png':
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(PNG)))
+            self.end_headers()
+            self.wfile.write(PNG)
+        elif self.path == '/page.html':
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'hi')
+        else:
+            self.send_error(404)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def host():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ImageHost)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield 'http://127.0.0.1:{}'.format(server.server_port)
+    server.shutdown()
+
+
+@pytest.fixture
+def store(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(thumbnails, 'directory', str(tmp_path))
+    monkeypatch.setattr(thumbnails, '_known', {})
+    monkeypatch.setitem(app.config, 'THUMBNAIL_ALLOW_PRIVATE', True)
+    return tmp_path
+
+
+def test_download_follows_redirects(host):
+    assert download(host + '/redirect', 5, 1024, True) == PNG
+
+
+def test_download_refuses_private_addresses(host):
+    with pytest.raises(ThumbnailError, match='private'):
+        download(host + '/image.png', 5, 1024, False)
+
+
+def test_download_refuses_non_images_and_large_bodies(host):
+    with pytest.raises(ThumbnailError, match='not an image'):
+        download(host + '/page.html', 5, 1024, True)
+    with pytest.raises(ThumbnailError, match='larger than'):
+        download(host + '/image.png', 5, 10, True)
+
+
+def test_fetch_stores_and_serves_thumbnail(app, client, host, store):
+    url = host + '/image.png'
+    assert thumbnails.fetch(url) == 'ok'
+    assert thumbnails.fetch(url) == 'cached'
+    with app.app_context():
+        path = thumbnails.url_for(url)
+    assert path.startswith('/thumbnails/' + thumbnail_stem(url))
+    response = client.get(path)
+    assert response.status_code == 200
+    assert 'max-age=604800' in response.headers['Cache-Control']
+
+
+def test_failed_fetch_leaves_marker_that_is_not_served(client, host, store):
+    url = host + '/missing.png'
+    assert thumbnails.fetch(url).startswith('failed')
+    marker = thumbnail_stem(url) + '.err'
+    assert os.path.isfile(os.path.join(str(store), marker))
+    assert thumbnails.fetch(url) == 'skipped'
+    assert client.get('/thumbnails/' + marker).status_code == 404
+
+
+def test_only_finished_images_are_served(client, store):
+    stem = thumbnail_stem('http://example.com/a.png')
+    for name in (stem + '.png.tmp', stem + '.err', 'notes.png'):
+        with open(os.path.join(str(store), name), 'wb') as f:
+            f.write(PNG)
+        assert client.get('/thumbnails/' + name).status_code == 404
+
+
+def test_url_for_works_without_a_request(app, store):
+    url = 'http://example.com/b.png'
+    with open(os.path.join(str(store), thumbnail_stem(url) + '.png'),
+              'wb') as f:
+        f.write(PNG)
+    with app.app_context():
+        assert thumbnails.url_for(url) == (
+            '/thumbnails/' + thumbnail_stem(url) + '.png')
@@ -0,0 +1,261 @@
+import hashlib
+import http.client
+import io
+import ipaddress
+import os
+import socket
+import ssl
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse
+import click
+from flask import abort, send_from_directory
+
+try:
+    from PIL import Image
+except ImportError:  # optional: without Pillow images are validated, not resized
+    Image = None
+
+#----------------------------------------------------------------------------#
+# Image thumbnails.
+#----------------------------------------------------------------------------#
+
+# image_link URLs are fetched in the background, validated and shrunk into
+# THUMBNAIL_DIR under a name derived from the URL, then served same-origin.
+# A failed fetch leaves a <name>.err marker so it is not retried before
+# THUMBNAIL_RETRY_AFTER; until a thumbnail exists pages use the original URL.
+
+SIGNATURES = (
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'GIF87a', '.gif'),
+    (b'GIF89a', '.gif'),
+)
+# Extensions a finished thumbnail can have; nothing else in THUMBNAIL_DIR
+# (.err markers, .tmp files being written) is served.
+EXTENSIONS = ('.jpg', '.png', '.gif', '.webp')
+
+
+class ThumbnailError(Exception):
+    pass
+
+
+def thumbnail_stem(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+
+
+def sniff(data):
+    for signature, ext in SIGNATURES:
+        if data.startswith(signature):
+            return ext
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return '.webp'
+    return None
+
+
+MAX_REDIRECTS = 3
+REDIRECTS = (301, 302, 303, 307, 308)
+
+
+def resolve(url, allow_private):
+    """Return (parts, port, address) for url, where address is the IP to
+    connect to. Raises ThumbnailError for private addresses."""
+    parts = urlparse(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ThumbnailError('not an http(s) URL')
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    try:
+        infos = socket.getaddrinfo(parts.hostname, port,
+                                   type=socket.SOCK_STREAM)
+    except OSError as e:
+        raise ThumbnailError(str(e))
+    if not allow_private:
+        # Don't let a listing make the server fetch from its own network.
+        for info in infos:
+            address = ipaddress.ip_address(info[4][0].split('%')[0])
+            if (address.is_private or address.is_loopback
+                    or address.is_link_local or address.is_reserved
+                    or address.is_multicast or address.is_unspecified):
+                raise ThumbnailError('refusing to fetch a private address')
+    return parts, port, infos[0][4][0]
+
+
+class PinnedHTTPConnection(http.client.HTTPConnection):
+    """Connects to an already checked address instead of resolving the
+    host again."""
+
+    def __init__(self, host, port, address, timeout):
+        http.client.HTTPConnection.__init__(self, host, port, timeout=timeout)
+        self.address = address
+
+    def connect(self):
+        self.sock = socket.create_connection((self.address, self.port),
+                                             self.timeout)
+
+
+class PinnedHTTPSConnection(PinnedHTTPConnection):
+    default_port = 443
+
+    def connect(self):
+        PinnedHTTPConnection.connect(self)
+        self.sock = ssl.create_default_context().wrap_socket(
+            self.sock, server_hostname=self.host)
+
+
+def download(url, timeout, max_bytes, allow_private):
+    # Redirects are followed by hand so every hop is checked.
+    for _ in range(MAX_REDIRECTS + 1):
+        parts, port, address = resolve(url, allow_private)
+        connection_class = (PinnedHTTPSConnection if parts.scheme == 'https'
+                            else PinnedHTTPConnection)
+        connection = connection_class(parts.hostname, port, address, timeout)
+        path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        try:
+            connection.request('GET', path,
+                               headers={'User-Agent': 'fyyur-thumbnailer'})
+            response = connection.getresponse()
+            if response.status in REDIRECTS:
+                location = response.getheader('Location')
+                if not location:
+                    raise ThumbnailError('redirect without a Location')
+                url = urljoin(url, location)
+                continue
+            if response.status != 200:
+                raise ThumbnailError('HTTP {}'.format(response.status))
+            content_type = response.getheader('Content-Type', '')
+            if not content_type.startswith('image/'):
+                raise ThumbnailError('not an image: ' + content_type)
+            data = response.read(max_bytes + 1)
+        except (OSError, http.client.HTTPException) as e:
+            raise ThumbnailError(str(e))
+        finally:
+            connection.close()
+        if len(data) > max_bytes:
+            raise ThumbnailError('image larger than {} bytes'.format(max_bytes))
+        return data
+    raise ThumbnailError('too many redirects')
+
+
+def make_thumbnail(data, size):
+    ext = sniff(data)
+    if ext is None:
+        raise ThumbnailError('unrecognised image data')
+    if Image is None:
+        return data, ext
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except Exception as e:
+        raise ThumbnailError('undecodable image: {}'.format(e))
+    image.thumbnail(size)
+    out = io.BytesIO()
+    image.convert('RGB').save(out, 'JPEG', quality=85, optimize=True)
+    return out.getvalue(), '.jpg'
+
+
+class Thumbnails(object):
+    def __init__(self):
+        self.config = None
+        self.directory = None
+        self.executor = None
+        self._known = {}
+
+    def init_app(self, app):
+        app.config.setdefault('THUMBNAIL_DIR',
+                              os.path.join(app.instance_path, 'thumbnails'))
+        app.config.setdefault('THUMBNAIL_SIZE', (400, 400))
+        app.config.setdefault('THUMBNAIL_TIMEOUT', 10)
+        app.config.setdefault('THUMBNAIL_MAX_BYTES', 5 * 1024 * 1024)
+        app.config.setdefault('THUMBNAIL_RETRY_AFTER', 24 * 60 * 60)
+        app.config.setdefault('THUMBNAIL_WORKERS', 4)
+        app.config.setdefault('THUMBNAIL_ALLOW_PRIVATE', False)
+        self.config = app.config
+        self.directory = app.config['THUMBNAIL_DIR']
+        os.makedirs(self.directory, exist_ok=True)
+        self.executor = ThreadPoolExecutor(app.config['THUMBNAIL_WORKERS'])
+        app.extensions['thumbnails'] = self
+        app.jinja_env.filters['thumbnail'] = self.url_for
+
+        @app.route('/thumbnails/<name>')
+        def thumbnail(name):
+            stem, ext = os.path.splitext(name)
+            if (ext not in EXTENSIONS or len(stem) != 32
+                    or not all(c in '0123456789abcdef' for c in stem)
+                    or not os.path.isfile(os.path.join(self.directory, name))):
+                abort(404)
+            response = send_from_directory(self.directory, name)
+            response.headers['Cache-Control'] = 'public, max-age=604800'
+            return response
+
+        @app.cli.command('fetch-thumbnails')
+        @click.option('--force', is_flag=True,
+                      help='Refetch images that already have thumbnails.')
+        def fetch_thumbnails_command(force):
+            """Fetch and resize every artist and venue image_link."""
+            from models import db, Artist, Venue
+            urls = {
+                url
+                for model in (Artist, Venue)
+                for url, in db.session.query(model.image_link).filter(
+                    model.image_link.isnot(None), model.image_link != '')
+            }
+            results = self.executor.map(lambda url: self.fetch(url, force),
+                                        sorted(urls))
+            for url, result in zip(sorted(urls), results):
+                print('{} {}'.format(result, url))
+
+    def _existing(self, stem):
+        for ext in EXTENSIONS:
+            if os.path.isfile(os.path.join(self.directory, stem + ext)):
+                return stem + ext
+        return None
+
+    def fetch(self, url, force=False):
+        stem = thumbnail_stem(url)
+        if not force and self._existing(stem):
+            return 'cached'
+        marker = os.path.join(self.directory, stem + '.err')
+        if (not force and os.path.isfile(marker) and time.time() -
+                os.path.getmtime(marker) < self.config['THUMBNAIL_RETRY_AFTER']):
+            return 'skipped'
+        try:
+            data = download(url, self.config['THUMBNAIL_TIMEOUT'],
+                            self.config['THUMBNAIL_MAX_BYTES'],
+                            self.config['THUMBNAIL_ALLOW_PRIVATE'])
+            data, ext = make_thumbnail(data, self.config['THUMBNAIL_SIZE'])
+        except ThumbnailError as e:
+            with open(marker, 'w') as f:
+                f.write(str(e))
+            return 'failed: {}'.format(e)
+        # Write then rename so readers never see a partial file.
+        path = os.path.join(self.directory, stem + ext)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+        if os.path.isfile(marker):
+            os.remove(marker)
+        self._known.pop(stem, None)
+        return 'ok'
+
+    def enqueue(self, url):
+        if url:
+            self.executor.submit(self.fetch, url)
+
+    def url_for(self, url):
+        if not url:
+            return url
+        stem = thumbnail_stem(url)
+        name, checked_at = self._known.get(stem, (None, None))
+        # Missing thumbnails are re-checked at most once a minute so list
+        # pages don't stat the disk for every tile.
+        if name is None and (checked_at is None
+                             or time.monotonic() - checked_at > 60):
+            name = self._existing(stem)
+            self._known[stem] = (name, time.monotonic())
+        if name is None:
+            return url
+        # Built by hand: tiles are also rendered outside requests (SSE).
+        return '/thumbnails/' + name
+
+
+thumbnails = Thumbnails()